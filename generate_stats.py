@@ -1,4 +1,4 @@
-#!/usr/bin/env python
+#!/usr/bin/env python3
 
 ###
 # Joseph Kennedy
@@ -6,17 +6,44 @@
 #
 # Generate Interface Statistics
 ###
-import profile
+import abc
+import cProfile
+import heapq
+import pstats
 import random
 import sys
 import os
 import re
 import argparse
+import io
+import json
+import csv
+import mmap
+import operator
+import shlex
+import string
+import struct
+import shutil
+import tarfile
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from array import array
 from collections import namedtuple
+from contextlib import redirect_stdout
+try:
+    import numpy
+except ImportError:
+    numpy = None
+try:
+    import resource
+except ImportError:
+    resource = None
 
 DEBUG = 1
 DEBUG_UTIL = 0
 DEBUG_LOOP = 1
+DEBUG_SEARCH = 0
 script_version = '0.00007'
 max_interfaces = 684
 default_int_max = 48
@@ -46,9 +73,111 @@ min_packet_size = 84
 default_packet_size = 1024
 max_packet_size = 1500
 max_rstp_transitions = 1024
+# Seconds between RSTP hellos, BPDUs a topology change sends out of every
+# other port and seconds a changed port stays blocked
+rstp_hello_time = 2
+rstp_tc_bpdus = 2
+rstp_forward_delay = 15
+# Chance a fully loaded half duplex port's frame collides, and the share
+# of collisions that come late
+default_collision_rate = 0.05
+late_collision_share = 0.02
 # Base all values on 1M
 multiplier = 1000000
 byte_multiplier = 1000
+# Array engines widen int64 counters to Python ints past this value
+max_array_counter = 2 ** 61
+# Random values drawn per block by the array engines
+draw_block_size = 65536
+# Seconds of traffic each port stream draws at a time
+stream_block = 256
+# Seconds of a random traffic profile drawn from one generator, and of
+# any profile evaluated at once when summing over long stretches
+profile_chunk = 4096
+profile_window = 1048576
+# Fast forward sums a cut port's profile second by second rather than
+# stopping at its edges when they come closer than this on average
+edge_spacing = 1024
+# Ports rendered per write when printing the interface table
+render_batch = 64
+# Bytes of a mapped statistics file split into tokens at a time
+parse_chunk = 16777216
+
+# Normalized options handed from main() to the generator engines
+Scenario = namedtuple('Scenario', [
+    'int_start', 'int_end', 'uplink1', 'uplink2', 'loop1', 'loop2',
+    'loop_after', 'runtime', 'packet_size', 'int_broadcast',
+    'int_multicast', 'int_unicast', 'broadcast_max', 'multicast_max',
+    'unicast_max', 'uplink_mode', 'domains', 'multicast', 'loop_model',
+    'storm_gain', 'rstp', 'profiles', 'impairments', 'discards', 'active'
+    ])
+
+# Counters held per port by the array engines
+counter_fields = (
+    'in_octets', 'out_octets', 'in_pkts', 'out_pkts',
+    'in_broadcast_pkts', 'out_broadcast_pkts',
+    'in_multicast_pkts', 'out_multicast_pkts',
+    'in_unicast_pkts', 'out_unicast_pkts',
+    'in_good_fragments', 'in_bad_fragments', 'in_discards', 'in_errors',
+    'collisions', 'late_collisions', 'crc_errors', 'mac_rx_errors',
+    'giant_pkts', 'short_pkts', 'jabber',
+    'in_bits_per_sec', 'out_bits_per_sec',
+    'in_pkts_per_sec', 'out_pkts_per_sec'
+    )
+CounterRows = namedtuple('CounterRows', counter_fields)
+# Values in a port's row, as read by interface_row() for the writers
+row_fields = (
+    ('port', 'mac', 'link', 'state', 'duplex', 'speed', 'trunk', 'tag',
+     'prio', 'vlan') + counter_fields + ('in_utilization', 'out_utilization')
+    )
+stats_row = operator.attrgetter(*['_' + name for name in row_fields[2:-2]])
+interface_stats = operator.attrgetter('interface_stats')
+utilization_inputs = operator.attrgetter(
+    '_speed', '_packet_size', '_in_pkts_per_sec', '_out_pkts_per_sec'
+    )
+counter_rows = CounterRows(*range(len(counter_fields)))
+error_rows = counter_rows[counter_rows.in_good_fragments:
+                          counter_rows.jabber + 1]
+# Packet and octet rows bumped alongside each traffic counter
+packet_rows = {
+    counter_rows.in_broadcast_pkts: (
+        counter_rows.in_pkts, counter_rows.in_octets),
+    counter_rows.out_broadcast_pkts: (
+        counter_rows.out_pkts, counter_rows.out_octets),
+    counter_rows.in_multicast_pkts: (
+        counter_rows.in_pkts, counter_rows.in_octets),
+    counter_rows.out_multicast_pkts: (
+        counter_rows.out_pkts, counter_rows.out_octets),
+    counter_rows.in_unicast_pkts: (
+        counter_rows.in_pkts, counter_rows.in_octets),
+    counter_rows.out_unicast_pkts: (
+        counter_rows.out_pkts, counter_rows.out_octets),
+    }
+# (uplink, access port) counters whose growth the uplinks collect: the
+# broadcast pair, the multicast and unicast pairs, then the error counters
+aggregate_fields = (
+    ('out_broadcast_pkts', 'out_broadcast_pkts'),
+    ('in_broadcast_pkts', 'in_broadcast_pkts'),
+    ('out_multicast_pkts', 'out_multicast_pkts'),
+    ('in_multicast_pkts', 'in_multicast_pkts'),
+    ('out_unicast_pkts', 'in_unicast_pkts'),
+    ('in_unicast_pkts', 'out_unicast_pkts'),
+    ) + tuple((name, name) for name in counter_fields[10:21])
+aggregate_rows = tuple(
+    (getattr(counter_rows, uplink), getattr(counter_rows, port))
+    for uplink, port in aggregate_fields
+    )
+# Where the in and out multicast port counters sit in aggregate_fields,
+# for keeping BPDUs out of the uplinks
+bpdu_folded = tuple(
+    [port for uplink, port in aggregate_fields].index(name)
+    for name in ('in_multicast_pkts', 'out_multicast_pkts')
+    )
+# Where each port counter sits in aggregate_fields, for the error counters
+# a link keeps to itself
+folded_index = dict(
+    (port, index) for index, (uplink, port) in enumerate(aggregate_fields)
+    )
 
 
 class VLAN(object):
@@ -62,12 +191,176 @@ class VLAN(object):
         self.router_interface = None
         self.rstp_priority = -1
 
+    def add_member(self, port, tagged):
+        self.add_members([port], tagged)
+
+    def add_members(self, ports, tagged):
+        # Ports already in the VLAN keep their first membership
+        lookup = self.member_lookup
+        new = [port for port in dict.fromkeys(ports) if port not in lookup]
+        lookup.update(dict.fromkeys(new, 'tagged' if tagged else 'untagged'))
+        self.members.extend(new)
+        if tagged:
+            self.tag_members.extend(new)
+        else:
+            self.untag_members.extend(new)
+
 
 class VLANTable:
+    """Every VLAN of the switch, with the untagged VLAN of each port.
+
+    vlan_lookup maps a VLAN ID to its position in vlans. index() builds
+    pvid, the untagged VLAN ID of each port; FloodDomains works out who
+    floods whom from the VLANs' members.
+    """
+
     def __init__(self):
         self.vlans = []
         self.vlan_lookup = {}
         self.platform = "icx"
+        self.pvid = {}
+
+    def add(self, vlan):
+        self.vlan_lookup[vlan.id] = len(self.vlans)
+        self.vlans.append(vlan)
+        return vlan
+
+    def get(self, vlan_id):
+        # The VLAN with this ID, added if it is new
+        if vlan_id in self.vlan_lookup:
+            return self.vlans[self.vlan_lookup[vlan_id]]
+        vlan = VLAN()
+        vlan.id = vlan_id
+        return self.add(vlan)
+
+    def index(self):
+        self.pvid = {}
+        for vlan in self.vlans:
+            self.pvid.update(dict.fromkeys(vlan.untag_members, vlan.id))
+
+
+class FloodDomains(object):
+    """Broadcast domains of the access ports, from the VLAN table.
+
+    Every VLAN that is some access port's Pvid is a domain. A port floods
+    the broadcast and multicast it receives into its Pvid's domain
+    (ingress) and is flooded by every domain whose VLAN it is a member of
+    (egress), so the fan-out each second is one total per domain handed
+    to that domain's members rather than every port to every port.
+    simple is set when each port's only domain is its Pvid's.
+    """
+
+    def __init__(self, vlan_table, access_ports):
+        position = dict((port, n) for n, port in enumerate(access_ports))
+        domains = {}
+        self.ingress = [
+            domains.setdefault(vlan_table.pvid[port], len(domains))
+            for port in access_ports
+            ]
+        self.count = len(domains)
+        self.egress = [[] for port in access_ports]
+        for vlan_id, domain in domains.items():
+            vlan = vlan_table.vlans[vlan_table.vlan_lookup[vlan_id]]
+            for port in vlan.members:
+                if port in position:
+                    self.egress[position[port]].append(domain)
+        self.simple = all([
+            egress == [domain]
+            for egress, domain in zip(self.egress, self.ingress)
+            ])
+
+    def flood(self, totals, position):
+        """What the access port at position is flooded with."""
+        if self.simple:
+            return totals[self.ingress[position]]
+        return sum([totals[domain] for domain in self.egress[position]])
+
+
+class MulticastGroups(FloodDomains):
+    """IGMP snooped multicast groups of the access ports.
+
+    The groups are dealt round the flooding domains. Every access port
+    sends its multicast to one group of its Pvid's domain (ingress) and
+    joins 1 to joins groups of it (egress), so a port only receives the
+    groups it listens to. Only the memberships are kept, as each port's
+    list of groups, so delivery costs one sum per membership rather than
+    ports x groups. Multicast sent where no group was dealt has no
+    listeners and goes to a last group nobody joins.
+    """
+
+    def __init__(self, domains, groups, joins):
+        domain_groups = [[] for domain in range(domains.count)]
+        for group in range(groups):
+            domain_groups[group % domains.count].append(group)
+        self.count = groups
+        self.ingress = []
+        self.egress = []
+        for domain in domains.ingress:
+            choices = domain_groups[domain]
+            if not choices:
+                self.count = groups + 1
+                self.ingress.append(groups)
+                self.egress.append([])
+                continue
+            self.ingress.append(random.choice(choices))
+            joined = random.sample(
+                choices, random.randint(1, min(joins, len(choices)))
+                )
+            self.egress.append(sorted(joined))
+        self.simple = all([
+            egress == [group]
+            for egress, group in zip(self.egress, self.ingress)
+            ])
+
+
+class RstpEvents(object):
+    """Spanning tree activity of the switch, scheduled by the second.
+
+    A hello BPDU goes out every rstp_hello_time seconds, sent by the
+    designated ports and received by the root port, or by both uplinks
+    when the root port is one of them. Their count follows from the
+    elapsed time, so hellos() hands out those due since it was last
+    asked and the engines add them when the counters are read. The
+    transitions are kept in a heap of (second, kind, port): a 'change'
+    blocks the port, sends TC BPDUs and floods the unicast of the flushed
+    MAC tables, and schedules the 'settle' that sets it forwarding again.
+    """
+
+    def __init__(self, ports, root, uplinks, runtime, transitions):
+        if root in uplinks:
+            self.receivers = set(uplinks)
+        else:
+            self.receivers = set([root])
+        self.sent = 0
+        self.events = []
+        for transition in range(transitions):
+            heapq.heappush(self.events, (
+                random.randrange(runtime), 'change', random.choice(ports)
+                ))
+
+    def hellos(self, elapsed):
+        """Hellos per port sent in elapsed seconds and not handed out."""
+        sent = (elapsed + rstp_hello_time - 1) // rstp_hello_time
+        new = sent - self.sent
+        self.sent = sent
+        return new
+
+    def next_event(self):
+        if self.events:
+            return self.events[0][0]
+        return None
+
+    def due(self, second):
+        """Pop the events of this second, scheduling what they lead to."""
+        events = []
+        while self.events and self.events[0][0] <= second:
+            event = heapq.heappop(self.events)
+            events.append(event)
+            if event[1] == 'change':
+                heapq.heappush(self.events, (
+                    second + rstp_forward_delay, 'settle', event[2]
+                    ))
+        return events
 
 
 class InterfaceTable:
@@ -78,6 +371,12 @@ class InterfaceTable:
         self.chassis_mac = default_mac_oui
         self.stats = None
 
+    def new_stats(self, index):
+        # Ports share one CounterBuffer once the table has been given one
+        if self.stats is None:
+            return DefaultInterfaceStats()
+        return BufferedInterfaceStats(self.stats, index)
+
 
 class InterfaceObject(object):
     def __init__(self):
@@ -102,7 +401,53 @@ class InterfaceObject(object):
         self.mac = "0000.0000.0000"
 
 
+# (bit ceiling, packet ceiling) of each speed and packet size in use
+line_rates = {}
+
+
+def line_rate(speed, packet_size):
+    # Ports of the same speed and packet size share their line rate, so
+    # it is worked out once per group of ports rather than per port
+    key = (speed, packet_size)
+    if key not in line_rates:
+        bit_ceiling = speed * multiplier
+        line_rates[key] = (bit_ceiling, bit_ceiling // (packet_size * 8))
+    return line_rates[key]
+
+
 class DefaultInterfaceStats(object):
+    # Counters live in slots and the limit tables are shared by every port
+    __slots__ = (
+        '_link', '_state', '_duplex', '_speed', '_trunk', '_tag', '_prio',
+        '_vlan', '_uplink', '_in_utilization', '_out_utilization',
+        '_packet_size', '_broadcast_limit', '_multicast_limit', '_runtime',
+        '_pkt_ceiling', '_bit_ceiling',
+        ) + tuple('_' + name for name in counter_fields)
+
+    # Limits
+    link_val_list = ("Up", "Down", "Disable")
+    state_val_list = ("None", "Up", "Down", "Forward", "Blocked")
+    duplex_val_list = ("None", "Half", "Full")
+    speed_val_list = (10, 100, 1000, 10000, 40000)
+    trunk_val_list = ("None", "Yes")
+    tag_val_list = ("None", "Yes")
+    prio_val_list = ("level0", "level1", "level2", "level3")
+    vlan_limits = (1, 4095)
+    uplink_limits = (0, 2)
+    packet_size_limits = (min_packet_size, max_packet_size)
+    # This actually needs to be updated whenever setting bits_per_sec
+    bits_per_sec_limits = (
+        0,
+        multiplier * default_int_speed
+    )
+    default_int_limits = (
+        0,
+        (multiplier * multiplier * multiplier * multiplier)
+    )
+    default_float_limits = (
+        0.00,
+        float(multiplier * multiplier * multiplier * multiplier)
+    )
 
     def __init__(self):
         self._link = "Down"
@@ -139,37 +484,14 @@ class DefaultInterfaceStats(object):
         self._out_bits_per_sec = 0
         self._in_pkts_per_sec = 0
         self._out_pkts_per_sec = 0
-        self._in_utilization = 0.00
-        self._out_utilization = 0.00
+        # Utilization is worked out when read, None until then
+        self._in_utilization = None
+        self._out_utilization = None
         self._packet_size = default_packet_size
-        self._broadcast_limit = [0, default_broadcast_limit]
-        self._multicast_limit = [0, default_multicast_limit]
+        self._broadcast_limit = default_broadcast_limit
+        self._multicast_limit = default_multicast_limit
         self._runtime = 0
-
-        # Limits
-        self.link_val_list = ["Up", "Down", "Disable"]
-        self.state_val_list = ["None", "Up", "Down"]
-        self.duplex_val_list = ["None", "Half", "Full"]
-        self.speed_val_list = [10, 100, 1000, 10000, 40000]
-        self.trunk_val_list = ["None", "Yes"]
-        self.tag_val_list = ["None", "Yes"]
-        self.prio_val_list = ["level0", "level1", "level2", "level3"]
-        self.vlan_limits = [1, 4095]
-        self.uplink_limits = [0, 2]
-        self.packet_size_limits = [min_packet_size, max_packet_size]
-        # This actually needs to be updated whenever setting bits_per_sec
-        self.bits_per_sec_limits = [
-            0,
-            multiplier * default_int_speed
-        ]
-        self.default_int_limits = [
-            0,
-            (multiplier * multiplier * multiplier * multiplier)
-        ]
-        self.default_float_limits = [
-            0.00,
-            float(multiplier * multiplier * multiplier * multiplier)
-        ]
+        self.update_ceilings()
 
     @property
     def link(self):
@@ -202,6 +524,8 @@ class DefaultInterfaceStats(object):
     @speed.setter
     def speed(self, speed):
         self._speed = self.limit_list(speed, self.speed_val_list)
+        self._in_utilization = self._out_utilization = None
+        self.update_ceilings()
 
     @property
     def trunk(self):
@@ -233,6 +557,9 @@ class DefaultInterfaceStats(object):
 
     @vlan.setter
     def vlan(self, vlan):
+        # Tagged uplinks report the top of the VLAN range
+        if vlan == default_tag_vlan:
+            vlan = self.vlan_limits[1]
         self._vlan = self.limit_int_value(vlan, self.vlan_limits)
 
     @property
@@ -284,7 +611,7 @@ class DefaultInterfaceStats(object):
     @in_broadcast_pkts.setter
     def in_broadcast_pkts(self, in_broadcast_pkts):
         change = in_broadcast_pkts - self._in_broadcast_pkts
-        limit = self._broadcast_limit[1]
+        limit = self._broadcast_limit
         if change >= self._in_broadcast_pkts + limit:
             self._in_broadcast_pkts += limit
             self._in_pkts += limit
@@ -301,7 +628,7 @@ class DefaultInterfaceStats(object):
     @out_broadcast_pkts.setter
     def out_broadcast_pkts(self, out_broadcast_pkts):
         change = out_broadcast_pkts - self._out_broadcast_pkts
-        limit = self._broadcast_limit[1]
+        limit = self._broadcast_limit
         if change >= self._out_broadcast_pkts + limit:
             self._out_broadcast_pkts += limit
             self._out_pkts += limit
@@ -317,10 +644,12 @@ class DefaultInterfaceStats(object):
 
     @in_multicast_pkts.setter
     def in_multicast_pkts(self, in_multicast_pkts):
-        change = in_multicast_pkts - self._in_multicast_pkts
-        self._in_multicast_pkts += self.limit_pkt_per_sec(change)
-        self._in_pkts += self.limit_pkt_per_sec(change)
-        self._in_octets += (self.limit_pkt_per_sec(change) * 8)
+        change = self.limit_pkt_per_sec(
+            in_multicast_pkts - self._in_multicast_pkts
+            )
+        self._in_multicast_pkts += change
+        self._in_pkts += change
+        self._in_octets += (change * 8)
 
     @property
     def out_multicast_pkts(self):
@@ -328,10 +657,12 @@ class DefaultInterfaceStats(object):
 
     @out_multicast_pkts.setter
     def out_multicast_pkts(self, out_multicast_pkts):
-        change = out_multicast_pkts - self._out_multicast_pkts
-        self._out_multicast_pkts += self.limit_pkt_per_sec(change)
-        self._out_pkts += self.limit_pkt_per_sec(change)
-        self._out_octets += (self.limit_pkt_per_sec(change) * 8)
+        change = self.limit_pkt_per_sec(
+            out_multicast_pkts - self._out_multicast_pkts
+            )
+        self._out_multicast_pkts += change
+        self._out_pkts += change
+        self._out_octets += (change * 8)
 
     @property
     def in_unicast_pkts(self):
@@ -339,10 +670,12 @@ class DefaultInterfaceStats(object):
 
     @in_unicast_pkts.setter
     def in_unicast_pkts(self, in_unicast_pkts):
-        change = in_unicast_pkts - self._in_unicast_pkts
-        self._in_unicast_pkts += self.limit_pkt_per_sec(change)
-        self._in_pkts += self.limit_pkt_per_sec(change)
-        self._in_octets += (self.limit_pkt_per_sec(change) * 8)
+        change = self.limit_pkt_per_sec(
+            in_unicast_pkts - self._in_unicast_pkts
+            )
+        self._in_unicast_pkts += change
+        self._in_pkts += change
+        self._in_octets += (change * 8)
 
     @property
     def out_unicast_pkts(self):
@@ -350,10 +683,12 @@ class DefaultInterfaceStats(object):
 
     @out_unicast_pkts.setter
     def out_unicast_pkts(self, out_unicast_pkts):
-        change = out_unicast_pkts - self._out_unicast_pkts
-        self._out_unicast_pkts += self.limit_pkt_per_sec(change)
-        self._out_pkts += self.limit_pkt_per_sec(change)
-        self._out_octets += (self.limit_pkt_per_sec(change) * 8)
+        change = self.limit_pkt_per_sec(
+            out_unicast_pkts - self._out_unicast_pkts
+            )
+        self._out_unicast_pkts += change
+        self._out_pkts += change
+        self._out_octets += (change * 8)
 
     @property
     def in_good_fragments(self):
@@ -466,6 +801,7 @@ class DefaultInterfaceStats(object):
     @in_pkts_per_sec.setter
     def in_pkts_per_sec(self, in_pkts_per_sec):
         self._in_pkts_per_sec = self.limit_pkt_per_sec(in_pkts_per_sec)
+        self._in_utilization = None
 
     @property
     def out_pkts_per_sec(self):
@@ -474,21 +810,24 @@ class DefaultInterfaceStats(object):
     @out_pkts_per_sec.setter
     def out_pkts_per_sec(self, out_pkts_per_sec):
         self._out_pkts_per_sec = self.limit_pkt_per_sec(out_pkts_per_sec)
+        self._out_utilization = None
 
     @property
     def in_utilization(self):
-        self._in_utilization = self.calc_utilization(
-            self._in_utilization,
-            self.in_pkts_per_sec
-            )
+        if self._in_utilization is None:
+            self._in_utilization = self.calc_utilization(
+                self._in_utilization,
+                self._in_pkts_per_sec
+                )
         return self._in_utilization
 
     @property
     def out_utilization(self):
-        self._out_utilization = self.calc_utilization(
-            self._out_utilization,
-            self.out_pkts_per_sec
-            )
+        if self._out_utilization is None:
+            self._out_utilization = self.calc_utilization(
+                self._out_utilization,
+                self._out_pkts_per_sec
+                )
         return self._out_utilization
 
     @property
@@ -501,25 +840,27 @@ class DefaultInterfaceStats(object):
             packet_size,
             self.packet_size_limits
             )
+        self._in_utilization = self._out_utilization = None
+        self.update_ceilings()
 
     @property
     def broadcast_limit(self):
-        return self._broadcast_limit[1]
+        return self._broadcast_limit
 
     @broadcast_limit.setter
     def broadcast_limit(self, broadcast_limit):
-        self._broadcast_limit[1] = self.limit_int_value(
+        self._broadcast_limit = self.limit_int_value(
             broadcast_limit,
             None
             )
 
     @property
     def multicast_limit(self):
-        return self._multicast_limit[1]
+        return self._multicast_limit
 
     @multicast_limit.setter
     def multicast_limit(self, multicast_limit):
-        self._multicast_limit[1] = self.limit_int_value(
+        self._multicast_limit = self.limit_int_value(
             multicast_limit,
             None
             )
@@ -537,41 +878,67 @@ class DefaultInterfaceStats(object):
             float(pkts_per_sec * 100) /
             (float(self.speed * multiplier)/float(self.packet_size * 8))
         )
-        if utilization > '100.00':
-            return '100.00'
+        if utilization > 100.00:
+            return 100.00
         return utilization
 
+    def update_ceilings(self):
+        # Line rate clamps, worked out again whenever speed or
+        # packet_size change rather than on every clamp
+        if self._speed is None:
+            self._bit_ceiling = self._pkt_ceiling = None
+            return
+        self._bit_ceiling, self._pkt_ceiling = line_rate(
+            self._speed, self._packet_size
+            )
+
     def limit_bit_per_sec(self, value):
-        low_limit = 0
-        upper_limit = (self.speed * multiplier)
-        if value < low_limit:
-            value = low_limit
-        elif value > upper_limit:
-            value = upper_limit
+        if value < 0:
+            return 0
+        if value > self._bit_ceiling:
+            return self._bit_ceiling
         return value
 
     def limit_pkt_per_sec(self, value):
-        low_limit = 0
-        upper_limit = (self.speed * multiplier)/(self.packet_size * 8)
-        if value < low_limit:
-            value = low_limit
-        elif value > upper_limit:
-            value = upper_limit
+        if value < 0:
+            return 0
+        if value > self._pkt_ceiling:
+            return self._pkt_ceiling
         return value
 
     def limit_int_value(self, value, limits):
-        if not limits:
-            low_limit = self.default_int_limits[0]
-            upper_limit = self.default_int_limits[1]
-        else:
-            low_limit = limits[0]
-            upper_limit = limits[1]
+        low_limit, upper_limit = limits or self.default_int_limits
         if value < low_limit:
             value = low_limit
         elif value > upper_limit:
             value = upper_limit
         return value
 
+    @property
+    def pkt_ceiling(self):
+        return self._pkt_ceiling
+
+    def add_bpdus(self, in_bpdus, out_bpdus):
+        # Switch originated multicast that never passes the line rate clamp
+        self._in_multicast_pkts += in_bpdus
+        self._in_pkts += in_bpdus
+        self._in_octets += (in_bpdus * 8)
+        self._out_multicast_pkts += out_bpdus
+        self._out_pkts += out_bpdus
+        self._out_octets += (out_bpdus * 8)
+
+    def add_storm(self, in_broadcast, out_broadcast):
+        # Loop storm broadcast already went through storm control, so it
+        # skips the broadcast limit and only the line rate applies
+        self._in_broadcast_pkts += in_broadcast
+        self._in_pkts += in_broadcast
+        self._in_octets += (in_broadcast * 8)
+        self._out_broadcast_pkts += out_broadcast
+        self._out_pkts += out_broadcast
+        self._out_octets += (out_broadcast * 8)
+        self.in_pkts_per_sec += in_broadcast
+        self.out_pkts_per_sec += out_broadcast
+
     def limit_float_value(self, value, limits):
         if not limits:
             low_limit = self.default_float_limits[0]
@@ -590,10 +957,7 @@ class DefaultInterfaceStats(object):
             return value
         return None
 
-
-class InterfaceStats(DefaultInterfaceStats):
-    def __init__(self, link, state, duplex, speed, trunk, tag, vlan):
-        DefaultInterfaceStats.__init__(self)
+    def configure(self, link, state, duplex, speed, trunk, tag, vlan):
         self.link = link
         self.state = state
         self.duplex = duplex
@@ -603,18 +967,240 @@ class InterfaceStats(DefaultInterfaceStats):
         self.vlan = vlan
 
 
+class InterfaceStats(DefaultInterfaceStats):
+    __slots__ = ()
+
+    def __init__(self, link, state, duplex, speed, trunk, tag, vlan):
+        DefaultInterfaceStats.__init__(self)
+        self.configure(link, state, duplex, speed, trunk, tag, vlan)
+
+
+class CounterBuffer(object):
+    """Counters for a whole table of ports packed into one array('q').
+
+    Port n owns the len(counter_fields) entries starting at
+    n * len(counter_fields), in counter_fields order. A value that no
+    longer fits in 64 bits widens the buffer to a list of Python ints so
+    the counters stay exact, as the array engines do.
+    """
+    __slots__ = ('ports', 'values')
+
+    def __init__(self, ports):
+        self.ports = ports
+        self.values = array('q', [0]) * (ports * len(counter_fields))
+
+    def set(self, index, value):
+        try:
+            self.values[index] = value
+        except OverflowError:
+            self.values = list(self.values)
+            self.values[index] = value
+
+
+class CounterSlot(object):
+    """Counter attribute that reads and writes a port's CounterBuffer entry."""
+    __slots__ = ('row',)
+
+    def __init__(self, row):
+        self.row = row
+
+    def __get__(self, stats, owner):
+        if stats is None:
+            return self
+        return stats._buffer.values[stats._offset + self.row]
+
+    def __set__(self, stats, value):
+        stats._buffer.set(stats._offset + self.row, value)
+
+
+def buffered_counters(cls):
+    for row, name in enumerate(counter_fields):
+        setattr(cls, '_' + name, CounterSlot(row))
+    return cls
+
+
+@buffered_counters
+class BufferedInterfaceStats(DefaultInterfaceStats):
+    # Same setters and clamps, counters kept in a shared CounterBuffer
+    __slots__ = ('_buffer', '_offset')
+
+    def __init__(self, buffer, index):
+        self._buffer = buffer
+        self._offset = index * len(counter_fields)
+        DefaultInterfaceStats.__init__(self)
+
+
 ###
 # Class that contains all patterns used to parse config
 ###
 class CompiledPattern:
     default_pattern = re.compile(".+ ")
+    # ICX style VLAN list, see read_vlan_list()
+    vlan_pattern = re.compile(r"^vlan (\d+)(?: name (\S+))?")
+    member_pattern = re.compile(r"^\s+(tagged|untagged)\s+(.+?)\s*$")
+    port_pattern = re.compile(
+        r"\s*(?:ethe(?:rnet)?\s+)?(?:\d+/\d+/)?(\d+)"
+        r"(?:\s+to\s+(?:ethe(?:rnet)?\s+)?(?:\d+/\d+/)?(\d+))?"
+        )
+
+
+######
+# VLAN list
+###
+def read_vlan_list(vlan_table, path, ports):
+    """Load an ICX style VLAN list into vlan_table.
+
+    Each VLAN starts with a "vlan <id> [name <name>]" line followed by
+    indented "tagged" and "untagged" lines listing its ports, e.g.
+    "untagged ethe 3 to 24 ethe 30" (unit/module/port names such as
+    1/1/3 use the port number). Lines starting with "!" or "#" and
+    members outside ports are skipped.
+    """
+    patterns = CompiledPattern
+    vlan = None
+    with open(path) as vlan_file:
+        for number, line in enumerate(vlan_file, 1):
+            if not line.strip() or line.lstrip()[:1] in ('!', '#'):
+                continue
+            where = '{0} line {1}: '.format(path, number)
+            matches = patterns.vlan_pattern.match(line)
+            if matches:
+                vlan_id = int(matches.group(1))
+                if not 1 <= vlan_id <= 4095:
+                    raise ValueError(where + 'VLAN ID out of range')
+                vlan = vlan_table.get(vlan_id)
+                vlan.name = matches.group(2) or vlan.name
+                continue
+            matches = patterns.member_pattern.match(line)
+            if not matches or vlan is None:
+                raise ValueError(where + 'expected a vlan or member line')
+            tagged = matches.group(1) == 'tagged'
+            members = [
+                port for port in parse_port_list(matches.group(2), where)
+                if port in ports
+                ]
+            if not tagged:
+                for port in members:
+                    if vlan_table.pvid.setdefault(port, vlan.id) != vlan.id:
+                        raise ValueError(
+                            where + 'port {0} is untagged in VLAN {1} '
+                            'already'.format(port, vlan_table.pvid[port])
+                            )
+            vlan.add_members(members, tagged)
+
+
+def parse_port_list(text, where=''):
+    """Ports of an ICX port list such as "ethe 1 to 4 ethe 1/1/9"."""
+    ports = []
+    position = 0
+    while position < len(text):
+        matches = CompiledPattern.port_pattern.match(text, position)
+        if not matches or matches.end() == position:
+            raise ValueError(where + 'bad port list ' + repr(text))
+        first = int(matches.group(1))
+        last = int(matches.group(2) or first)
+        ports.extend(range(first, last + 1))
+        position = matches.end()
+    return ports
+
+
+######
+# Port speeds
+###
+def parse_interface_mix(text, speed):
+    """(speed, share) pairs of an --interface-mix option.
+
+    A plain percentage runs that share of the access ports at speed and
+    spreads the rest evenly over the other speeds, "speed=share,..."
+    gives the share of each speed outright.
+    """
+    speeds = DefaultInterfaceStats.speed_val_list
+    try:
+        percent = int(text)
+    except ValueError:
+        percent = None
+    if percent is not None:
+        if percent < 0:
+            percent = random.randint(0, 100)
+        percent = min(percent, 100)
+        others = [other for other in speeds if other != speed]
+        return [(speed, float(percent))] + [
+            (other, (100.0 - percent) / len(others)) for other in others
+            ]
+    mix = []
+    for setting in text.split(','):
+        value, equals, share = setting.partition('=')
+        try:
+            value = int(value)
+            share = float(share)
+        except ValueError:
+            raise ValueError('bad interface mix ' + repr(setting))
+        if value not in speeds or share < 0:
+            raise ValueError(
+                'interface mix speeds must be one of ' +
+                ','.join(str(other) for other in speeds) +
+                ' with a share of 0 or more'
+                )
+        mix.append((value, share))
+    if not sum(share for value, share in mix):
+        raise ValueError('interface mix shares add up to 0')
+    return mix
+
+
+def port_speeds(ports, mix):
+    """Speed of each port, dealt out by the shares of an interface mix.
+
+    Each speed gets its share of the ports rounded by largest remainder,
+    and the ports are shuffled before the speeds are dealt out in runs,
+    so ports of a speed end up scattered over the chassis.
+    """
+    ports = list(ports)
+    total = sum(share for speed, share in mix)
+    exact = [share * len(ports) / total for speed, share in mix]
+    counts = [int(value) for value in exact]
+    spare = len(ports) - sum(counts)
+    for n in sorted(range(len(mix)), key=lambda n: counts[n] - exact[n])[
+            :spare]:
+        counts[n] += 1
+    if max(counts) < len(ports):
+        random.shuffle(ports)
+    speeds = {}
+    start = 0
+    for (speed, share), count in zip(mix, counts):
+        for port in ports[start:start + count]:
+            speeds[port] = speed
+        start += count
+    return speeds
 
 
 ######
 # Main
 ###
 def main(args):
+    if args.out_file == '-' and not args.fleet:
+        # Keep stdout for the statistics and send the chatter to stderr
+        with redirect_stdout(sys.stderr):
+            welcome_banner()
+            single_switch(args)
+        return
     welcome_banner()
+    if args.fleet:
+        fleet(args)
+    else:
+        single_switch(args)
+
+
+def single_switch(args):
+    if args.profile or args.profile_stats:
+        profile_switch(args)
+    else:
+        generate_switch(args, args.seed)
+
+
+def generate_switch(args, seed=None):
+    phase_clock.switch('setup')
+    seeds = SwitchSeeds(seed)
+    random.seed(seeds.setup)
     eth_table = InterfaceTable()
     vlan_table = VLANTable()
 
@@ -629,6 +1215,10 @@ def main(args):
     elif args.total_ports < 1:
         int_end = random.randint(int_start, max_interfaces)
 
+    # Shared counter storage
+    if args.shared_counters:
+        eth_table.stats = CounterBuffer(int_end - int_start + 1)
+
     # Uplinks
     uplink1 = args.uplink1
     uplink2 = args.uplink2
@@ -683,11 +1273,16 @@ def main(args):
     elif args.root < 1:
         args.root = random.randint(int_start, int_end)
 
-    # % Mix of interface speeds
-    if args.interface_mix < 1:
-        int_mix = random.randint(int_start, int_end)
-    elif args.interface_mix > 100:
-        int_mix = 100
+    # Interface speed and the mix of speeds over the access ports
+    int_speed = args.interface_speed
+    if int_speed == -1:
+        int_speed = random.choice(DefaultInterfaceStats.speed_val_list)
+    int_mix = parse_interface_mix(args.interface_mix, int_speed)
+    int_speeds = port_speeds(
+        [int for int in range(int_start, int_end + 1)
+         if int != uplink1 and int != uplink2],
+        int_mix
+        )
 
     # Unicast traffic
     if args.unicast < 1:
@@ -735,22 +1330,68 @@ def main(args):
     else:
         broadcast_limit = default_broadcast_limit
 
+    # Active ports, the uplinks, looped ports and RSTP root among them
+    ports = list(range(int_start, int_end + 1))
+    active = ports
+    if args.active == -1:
+        active_count = random.randint(1, len(ports))
+    elif args.active >= 1:
+        active_count = min(args.active, len(ports))
+    else:
+        active_count = len(ports)
+    if active_count < len(ports):
+        required = set([uplink1, uplink2, loop1, loop2, args.root])
+        active = [int for int in ports if int in required]
+        active.extend(random.sample(
+            [int for int in ports if int not in required],
+            max(active_count - len(active), 0)
+            ))
+        active.sort()
+    active_set = set(active)
+
     # VLAN Setup
+    access_ports = [
+        int for int in range(int_start, int_end + 1)
+        if int != uplink1 and int != uplink2
+        ]
     if not args.vlan_list:
         vlan = VLAN()
         if args.vlan > 0:
             vlan.id = args.vlan
         elif args.vlan < 0:
             vlan.id = random.randint(1, 4095)
+        else:
+            vlan.id = default_vlan
         if args.uplink1:
-            vlan.members.append(uplink1)
-            vlan.tag_members.append(uplink1)
+            vlan.add_member(uplink1, True)
         if args.uplink2:
-            vlan.members.append(uplink2)
-            vlan.tag_members.append(uplink2)
+            vlan.add_member(uplink2, True)
+        for int in access_ports:
+            vlan.add_member(int, False)
+        vlan_table.add(vlan)
+    else:
+        read_vlan_list(
+            vlan_table, args.vlan_list, set(range(int_start, int_end + 1))
+            )
+        # Ports left out of the list stay in the default VLAN, and the
+        # uplinks trunk every VLAN
+        for int in access_ports:
+            if int not in vlan_table.pvid:
+                vlan_table.get(default_vlan).add_member(int, False)
+        for vlan in vlan_table.vlans:
+            vlan.add_member(uplink1, True)
+            vlan.add_member(uplink2, True)
+    vlan_table.index()
+    domains = FloodDomains(
+        vlan_table, [int for int in access_ports if int in active_set]
+        )
 
-        vlan_table.vlans.append(vlan)
-        vlan_table.vlan_lookup[vlan.id] = len(vlan_table.vlans)
+    # Multicast groups, or flooded like broadcast without snooping
+    multicast = domains
+    if args.multicast_groups > 0:
+        multicast = MulticastGroups(
+            domains, args.multicast_groups, args.multicast_joins
+            )
 
     # Runtime
     if args.runtime >= 1:
@@ -778,6 +1419,16 @@ def main(args):
         packet_size = min_packet_size
     elif args.packet_size > max_packet_size:
         packet_size = max_packet_size
+
+    # Impairments
+    half_duplex = set()
+    if args.half_duplex:
+        half_duplex.update(parse_port_list(args.half_duplex))
+    impairments = None
+    if args.bit_error_rate > 0 or half_duplex:
+        impairments = Impairments(
+            args.bit_error_rate, args.collision_rate, packet_size
+            )
     # Setup all interfaces
     for int in range(int_start, int_end + 1):
         if int not in eth_table.interface_lookup:
@@ -789,22 +1440,47 @@ def main(args):
                 seed=eth_table.chassis_mac[:12], mac_gen=int
                 )
             # Initialize the Stats
-            eth_int.interface_stats = DefaultInterfaceStats()
-            eth_int.interface_stats.vlan = vlan.id
+            eth_int.interface_stats = eth_table.new_stats(int - int_start)
+            eth_int.interface_stats.vlan = vlan_table.pvid.get(
+                int, default_vlan
+                )
             eth_int.interface_stats.link = "Up"
-            eth_int.interface_stats.duplex = "Full"
-            eth_int.interface_stats.speed = 100
             eth_int.interface_stats.state = "Up"
+            if int not in active_set:
+                # Unplugged or shut down
+                eth_int.interface_stats.link = random.choice(
+                    DefaultInterfaceStats.link_val_list[1:]
+                    )
+                eth_int.interface_stats.state = "Down"
+                if eth_int.interface_stats.link == "Disable":
+                    eth_int.interface_stats.state = "None"
+            eth_int.interface_stats.duplex = "Full"
+            if int in half_duplex:
+                eth_int.interface_stats.duplex = "Half"
+            eth_int.interface_stats.speed = int_speeds.get(int, int_speed)
             eth_int.interface_stats.broadcast_limit = broadcast_limit
             eth_int.interface_stats.multicast_limit = multicast_limit
 
             eth_table.interfaces.append(eth_int)
             eth_table.interface_lookup[int] = len(eth_table.interfaces) - 1
 
+    # RSTP transitions
+    rstp_transitions = args.rstp_transitions
+    if rstp_transitions == -1:
+        rstp_transitions = random.randint(0, max_rstp_transitions)
+    elif rstp_transitions > max_rstp_transitions:
+        rstp_transitions = max_rstp_transitions
+    elif rstp_transitions < 0:
+        rstp_transitions = default_rstp_transitions
+    rstp = RstpEvents(
+        active, args.root, (uplink1, uplink2), runtime, rstp_transitions
+        )
+
     # Set special interfaces
     # Uplink 1
     uplink1_int = eth_table.interfaces[eth_table.interface_lookup[uplink1]]
-    uplink1_int.interface_stats = InterfaceStats(
+    uplink1_int.interface_stats = eth_table.new_stats(uplink1 - int_start)
+    uplink1_int.interface_stats.configure(
         "Up", "Up", "Full", uplink_speed, "Yes", "Yes", default_tag_vlan
         )
     uplink1_int.interface_stats.uplink = 1
@@ -812,207 +1488,1434 @@ def main(args):
     # uplink1_int.interface_stats.multicast_limit = multicast_limit
     # Uplink 2
     uplink2_int = eth_table.interfaces[eth_table.interface_lookup[uplink2]]
-    uplink2_int.interface_stats = InterfaceStats(
+    uplink2_int.interface_stats = eth_table.new_stats(uplink2 - int_start)
+    uplink2_int.interface_stats.configure(
         "Up", "Up", "Full", uplink_speed, "Yes", "Yes", default_tag_vlan
         )
     uplink2_int.interface_stats.uplink = 2
     # uplink2_int.interface_stats.broadcast_limit = broadcast_limit
     # uplink2_int.interface_stats.multicast_limit = multicast_limit
 
-    total_in_broadcast_per_sec = 0
-    total_in_multicast_per_sec = 0
-    total_out_broadcast_per_sec = 0
-    total_out_multicast_per_sec = 0
+    scenario = Scenario(
+        int_start=int_start,
+        int_end=int_end,
+        uplink1=uplink1,
+        uplink2=uplink2,
+        loop1=loop1,
+        loop2=loop2,
+        loop_after=loop_after,
+        runtime=runtime,
+        packet_size=packet_size,
+        int_broadcast=int_broadcast,
+        int_multicast=int_multicast,
+        int_unicast=int_unicast,
+        broadcast_max=args.broadcast_max,
+        multicast_max=args.multicast_max,
+        unicast_max=args.unicast_max,
+        uplink_mode=args.uplink_mode,
+        domains=domains,
+        multicast=multicast,
+        loop_model=args.loop_model,
+        storm_gain=args.storm_gain,
+        rstp=rstp,
+        profiles=[
+            parse_traffic_profile(text)
+            for text in args.traffic_profile or []
+            ],
+        impairments=impairments,
+        discards=args.discards,
+        active=active,
+        )
 
-    # Packet Generator Loop
-    for i in range(0, runtime):
+    if args.snapshot_every >= 1:
+        # Snapshots are the output, the last one holds the final state
+        snapshots = SnapshotWriter(
+            eth_table, args.out_file, args.buffer_size,
+            args.snapshot_every, runtime, args.snapshot_format, args.format
+            )
+        phase_clock.switch('generation')
+        try:
+            engines[args.engine](eth_table, scenario, seeds, snapshots)
+        finally:
+            snapshots.close()
+            phase_clock.stop()
+        return eth_table
+    phase_clock.switch('generation')
+    engines[args.engine](eth_table, scenario, seeds)
+
+    # OUTPUT
+    phase_clock.switch('output')
+    write_interfaces(
+        eth_table, args.out_file, args.buffer_size, args.format, runtime
+        )
+    phase_clock.stop()
+    return eth_table
 
-        in_pkts_per_sec = 0
-        out_pkts_per_sec = 0
 
-        if loop1 == 0 and loop2 == 0:
-            total_in_broadcast_per_sec = 0
-            total_in_multicast_per_sec = 0
-            total_out_broadcast_per_sec = 0
-            total_out_multicast_per_sec = 0
-        # Reset Uplink per second stats
-        reset_per_sec(uplink1_int.interface_stats)
-        reset_per_sec(uplink2_int.interface_stats)
-        # Statistics outside of Main generation loop
-        rstp_hellos = runtime / 2
-        if uplink1_int:
-            uplink1_int.interface_stats.in_multicast_pkts += rstp_hellos
-            uplink1_int.interface_stats.out_multicast_pkts += rstp_hellos
-            # Standard broadcast should happen here
-            # uplink1_int.interface_stats.out_pkts += int_broadcast
-            # uplink1_int.interface_stats.out_broadcast_pkts += int_broadcast *
-            # runtime
-        if uplink2_int:
-            uplink2_int.interface_stats.out_multicast_pkts += rstp_hellos
-            uplink2_int.interface_stats.in_multicast_pkts += rstp_hellos
-            # Standard broadcast should happen here
-            # uplink2_int.interface_stats.out_pkts += int_broadcast * runtime
-            # uplink2_int.interface_stats.out_broadcast_pkts += int_broadcast *
-            # runtime
+def open_output(path, buffer_size, binary=False):
+    mode = 'wb' if binary else 'w'
+    if path == '-':
+        return open(
+            sys.__stdout__.fileno(), mode, buffering=buffer_size,
+            closefd=False
+            )
+    return open(path, mode, buffering=buffer_size)
 
-        # Main Work Area
-        for int in range(int_start, int_end + 1):
-            if (int in eth_table.interface_lookup and
-                    (int != uplink1) and
-                    (int != uplink2)):
-                eth_int = eth_table.interfaces[eth_table.interface_lookup[int]]
-                stats = eth_int.interface_stats
-
-                stats.packet_size = packet_size
-                # Reset the per second stats every run
-                reset_per_sec(stats)
-                # Statistics Generation
-                # Switch originated traffic
-                stats.out_multicast_pkts += rstp_hellos
-
-                # Calculate broadcast first to prevent exclusion
-                # if (int != loop1) and (int != loop2):
-                if int_broadcast <= -1:
-                    if args.broadcast_max > 0:
-                        broadcast = (
-                            args.broadcast_max
-                            )
-                    else:
-                        broadcast = int_broadcast
-                    random_broadcast = random.randint(
-                        0,
-                        stats.broadcast_limit
-                        )
-                    stats.in_broadcast_pkts += random_broadcast
-                    total_in_broadcast_per_sec += random_broadcast
-                else:
-                    # stats.in_pkts += int_broadcast
-                    stats.in_broadcast_pkts += int_broadcast
-                    total_in_broadcast_per_sec += int_broadcast
-                # Calculate multicast second to prevent exclusion
-                if int_multicast == -1:
-                    if (args.multicast_max > 0 and
-                            stats.multicast_limit < args.multicast_max):
-                        multicast = (
-                            args.multicast_max
-                            )
-                    else:
-                        multicast = int_multicast
 
-                    random_multicast = random.randint(
-                        0, stats.multicast_limit
-                        )
-                    stats.in_multicast_pkts += random_multicast
-                    total_in_multicast_per_sec += random_multicast
-                    stats.in_pkts_per_sec += random_multicast
+def write_interfaces(eth_table, path, buffer_size, output_format='text',
+                     elapsed=0):
+    # Ports are rendered and written a batch at a time
+    interfaces = eth_table.interfaces
+    if output_format == 'text':
+        renderer = InterfaceRenderer()
+        out_file = open_output(path, buffer_size)
+    else:
+        writer = row_writers[output_format]
+        out_file = open_output(path, buffer_size, writer.binary)
+        writer = writer(out_file, len(interfaces))
+    fill_utilization(interfaces)
+    try:
+        with out_file:
+            for start in range(0, len(interfaces), render_batch):
+                rows = [
+                    interface_row(interface)
+                    for interface in interfaces[start:start + render_batch]
+                    ]
+                if output_format == 'text':
+                    out_file.write(renderer.render_rows(rows))
                 else:
-                    # stats.in_pkts += int_multicast
-                    stats.in_multicast_pkts += int_multicast
-                    total_in_multicast_per_sec += int_multicast
-                    stats.in_pkts_per_sec += int_multicast
-                if int_unicast == -1:
-                    if args.unicast_max > 0 and args.unicast_max < stats.speed:
-                        max_unicast = (
-                            args.unicast_max * multiplier/packet_size
-                            )
-                    else:
-                        max_unicast = (
-                            stats.speed * multiplier/packet_size
-                            )
+                    writer.write_rows(elapsed, rows)
+    except BrokenPipeError:
+        # The reader went away early, e.g. piped into head
+        pass
+
+
+class SnapshotWriter(object):
+    """Stream of the interface counters every few simulated seconds.
+
+    The engines ask due() after each second and call emit() when it is
+    true. Full snapshots repeat the interface_print view under a
+    "Snapshot <seconds>" line. Each InterfaceRenderer line is kept per
+    port and only re-rendered when one of the values it shows has
+    changed. Delta snapshots write one line per changed port instead,
+    with counters as +increments and the per second rates as they stand.
+    Other output formats get every port's row at each snapshot from
+    their RowWriter.
+    """
+
+    def __init__(self, eth_table, path, buffer_size, every, runtime, style,
+                 output_format='text'):
+        self.eth_table = eth_table
+        self.every = every
+        self.runtime = runtime
+        self.style = style
+        self.closed = False
+        self.writer = None
+        if output_format == 'text':
+            self.out_file = open_output(path, buffer_size)
+        else:
+            writer = row_writers[output_format]
+            self.out_file = open_output(path, buffer_size, writer.binary)
+            self.writer = writer(
+                self.out_file, len(eth_table.interfaces) * len(self.seconds())
+                )
+        self.renderer = InterfaceRenderer()
+        self.counter_row = operator.attrgetter(*[
+            '_' + name for name in counter_fields
+            ])
+        self.rendered = [None] * len(eth_table.interfaces)
+        self.previous = [
+            (0,) * len(counter_fields) for interface in eth_table.interfaces
+            ]
+
+    def seconds(self):
+        """Elapsed seconds that get a snapshot, in order."""
+        elapsed = list(range(self.every, self.runtime + 1, self.every))
+        if not elapsed or elapsed[-1] != self.runtime:
+            elapsed.append(self.runtime)
+        return elapsed
+
+    def due(self, elapsed):
+        return elapsed % self.every == 0 or elapsed == self.runtime
+
+    def emit(self, elapsed):
+        if self.closed:
+            return
+        phase_clock.switch('output')
+        if self.style != 'delta':
+            fill_utilization(self.eth_table.interfaces)
+        try:
+            if self.writer is not None:
+                self.writer.write_rows(elapsed, [
+                    interface_row(interface)
+                    for interface in self.eth_table.interfaces
+                    ])
+            elif self.style == 'delta':
+                self.emit_delta(elapsed)
+            else:
+                self.emit_full(elapsed)
+        except BrokenPipeError:
+            # The reader went away early, stop emitting
+            self.close()
+
+    def emit_full(self, elapsed):
+        write = self.out_file.write
+        write('Snapshot {0}\n'.format(elapsed))
+        lines = self.renderer.lines
+        row_of = self.renderer.row
+        for index, interface in enumerate(self.eth_table.interfaces):
+            row = row_of(interface)
+            cached = self.rendered[index]
+            if cached is None:
+                cached = self.rendered[index] = [
+                    None, [None] * len(lines), [''] * len(lines), ''
+                    ]
+            elif cached[0] == row:
+                write(cached[3])
+                continue
+            shown, rendered = cached[1], cached[2]
+            for n, (template, getter) in enumerate(lines):
+                values = getter(row)
+                if values != shown[n]:
+                    shown[n] = values
+                    rendered[n] = template % values
+            cached[0] = row
+            cached[3] = ''.join(rendered)
+            write(cached[3])
+
+    def emit_delta(self, elapsed):
+        write = self.out_file.write
+        rates = counter_rows.in_bits_per_sec
+        for index, interface in enumerate(self.eth_table.interfaces):
+            current = self.counter_row(interface.interface_stats)
+            previous = self.previous[index]
+            if current == previous:
+                continue
+            self.previous[index] = current
+            changes = []
+            for row, name in enumerate(counter_fields):
+                if current[row] == previous[row]:
+                    continue
+                if row < rates:
+                    changes.append('{0}=+{1}'.format(
+                        name, current[row] - previous[row]
+                        ))
                 else:
-                    max_unicast = (int_unicast * multiplier/packet_size)
-                in_pkts = random.randint(0, max_unicast)
-                out_pkts = random.randint(0, max_unicast)
-                # stats.in_pkts += in_pkts
-                stats.in_unicast_pkts += in_pkts
-                # stats.in_octets += (in_pkts * packet_size)
-                stats.in_pkts_per_sec += in_pkts
-                # stats.out_pkts += out_pkts
-                stats.out_unicast_pkts += out_pkts
-                # stats.out_octets += (out_pkts * packet_size)
-                stats.out_pkts_per_sec += out_pkts
-                stats.in_bits_per_sec += (
-                    stats.in_pkts_per_sec * packet_size * 8
+                    changes.append('{0}={1}'.format(name, current[row]))
+            write('{0} {1} {2}\n'.format(
+                elapsed, interface.name, ' '.join(changes)
+                ))
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            self.out_file.close()
+        except BrokenPipeError:
+            pass
+
+
+class RowWriter(abc.ABC):
+    """Base of the --format writers, fed rows from interface_row().
+
+    records is the number of rows the writer will be given, for formats
+    that record it up front.
+    """
+    binary = False
+
+    def __init__(self, out_file, records):
+        self.out_file = out_file
+
+    @abc.abstractmethod
+    def write_rows(self, elapsed, rows):
+        """Write the rows of the snapshot taken elapsed seconds in."""
+
+
+class JsonLinesWriter(RowWriter):
+    # One object per port per snapshot
+    fields = ('second',) + row_fields
+
+    def write_rows(self, elapsed, rows):
+        fields = self.fields
+        self.out_file.write(''.join([
+            json.dumps(dict(zip(fields, (elapsed,) + row))) + '\n'
+            for row in rows
+            ]))
+
+
+class CsvWriter(RowWriter):
+    # Header row, then one row per port per snapshot
+
+    def __init__(self, out_file, records):
+        RowWriter.__init__(self, out_file, records)
+        self.writer = csv.writer(out_file, lineterminator='\n')
+        self.writer.writerow(('second',) + row_fields)
+
+    def write_rows(self, elapsed, rows):
+        self.writer.writerows([(elapsed,) + row for row in rows])
+
+
+class BinaryWriter(RowWriter):
+    """Fixed size little endian records in a NumPy .npy file.
+
+    The file opens with a .npy header describing the structured record,
+    so numpy.load(path, mmap_mode='r') maps it without copying. The
+    header is written by hand so NumPy is not needed to produce it. Only
+    the numeric fields are kept, and counters wrap at 2**64 the way
+    SNMP Counter64 values do.
+    """
+    binary = True
+    fields = (
+        ('second', 'port', 'speed', 'vlan') + counter_fields +
+        ('in_utilization', 'out_utilization')
+        )
+    record = struct.Struct('<' + 'Q' * (len(fields) - 2) + 'dd')
+    counter_mask = 2 ** 64 - 1
+
+    def __init__(self, out_file, records):
+        RowWriter.__init__(self, out_file, records)
+        descr = [(name, '<u8') for name in self.fields[:-2]]
+        descr += [(name, '<f8') for name in self.fields[-2:]]
+        header = "{{'descr': {0!r}, 'fortran_order': False, " \
+            "'shape': ({1},), }}".format(descr, records)
+        # Magic, version 1.0 and header length, padded to 64 bytes
+        header += ' ' * (-(10 + len(header) + 1) % 64) + '\n'
+        out_file.write(
+            b'\x93NUMPY\x01\x00' + struct.pack('<H', len(header)) +
+            header.encode('latin1')
+            )
+
+    def write_rows(self, elapsed, rows):
+        pack = self.record.pack
+        mask = self.counter_mask
+        r = row_fields.index
+        port, speed, vlan = r('port'), r('speed'), r('vlan')
+        counters = slice(r(counter_fields[0]), r(counter_fields[-1]) + 1)
+        self.out_file.write(b''.join([
+            pack(
+                elapsed, int(row[port]), row[speed], row[vlan],
+                *([value & mask for value in row[counters]] + list(row[-2:]))
+                )
+            for row in rows
+            ]))
+
+
+row_writers = {
+    'jsonl': JsonLinesWriter,
+    'csv': CsvWriter,
+    'binary': BinaryWriter,
+    }
+
+
+######
+# Fleet
+###
+def fleet(args):
+    """Generate every switch in the args.fleet manifest.
+
+    Each manifest line is the command line of one switch, starting with
+    its output file name. Switches are spread over a process pool and
+    each gets its own seed spawned from args.seed, unless its line sets
+    one, so the same manifest and seed always produce the same fleet.
+    """
+    parser = build_parser()
+    switches = []
+    with open(args.fleet) as manifest:
+        for line in manifest:
+            line = line.split('#', 1)[0].strip()
+            if not line:
+                continue
+            switch_args = parser.parse_args(shlex.split(line))
+            check_args(parser, switch_args)
+            if switch_args.fleet:
+                parser.error('--fleet cannot be nested in a fleet manifest')
+            switches.append(switch_args)
+    names = [switch_args.out_file for switch_args in switches]
+    if len(set(names)) != len(names):
+        parser.error('Fleet manifest repeats an output file name')
+
+    archive = args.out_file.endswith(('.tar', '.tar.gz', '.tgz'))
+    if archive:
+        out_dir = tempfile.mkdtemp(prefix='generate_stats_')
+    else:
+        out_dir = args.out_file
+        if not os.path.isdir(out_dir):
+            os.makedirs(out_dir)
+
+    root, seeds = spawn_seeds(args.seed, len(switches))
+    print('Fleet seed {0}'.format(root))
+    start = time.time()
+    workers = args.workers if args.workers >= 1 else None
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        jobs = []
+        for switch_args, seed in zip(switches, seeds):
+            if switch_args.seed is not None:
+                seed = switch_args.seed
+            path = os.path.join(out_dir, switch_args.out_file)
+            jobs.append(pool.submit(fleet_switch, switch_args, seed, path))
+        for job in as_completed(jobs):
+            name, elapsed = job.result()
+            print('{0:<32} {1:>10.3f}s'.format(name, elapsed))
+    print('{0} switches in {1:.3f}s'.format(
+        len(switches), time.time() - start
+        ))
+
+    if archive:
+        mode = 'w'
+        if args.out_file.endswith(('.gz', '.tgz')):
+            mode = 'w:gz'
+        with tarfile.open(args.out_file, mode) as tar:
+            for name in names:
+                tar.add(os.path.join(out_dir, name), arcname=name)
+        shutil.rmtree(out_dir)
+
+
+def fleet_switch(args, seed, path):
+    # Runs in a pool worker, the switch's seed drives every engine
+    start = time.time()
+    name = args.out_file
+    args.out_file = path
+    with redirect_stdout(io.StringIO()):
+        generate_switch(args, seed)
+    return name, time.time() - start
+
+
+######
+# Benchmark
+###
+class PhaseClock(object):
+    """Wall time per phase of a run, while enabled.
+
+    The generator calls switch() as it moves between phases, which
+    charges the time since the last switch to the phase being left.
+    Disabled it only costs the enabled check.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.totals = {}
+        self.current = None
+        self.started = 0.0
+
+    def enable(self):
+        self.enabled = True
+        self.totals = {}
+        self.current = None
+
+    def switch(self, phase):
+        if not self.enabled:
+            return
+        now = time.time()
+        if self.current is not None:
+            self.totals[self.current] = (
+                self.totals.get(self.current, 0.0) + now - self.started
+                )
+        self.current = phase
+        self.started = now
+
+    def stop(self):
+        self.switch(None)
+
+
+phase_clock = PhaseClock()
+
+
+def bench(argv):
+    """Time the generator over a grid of port counts and runtimes."""
+    parser = argparse.ArgumentParser(
+        prog='generate_stats.py bench',
+        description='Time the generator over a grid of --total-ports and ' +
+        '--runtime values and save the results as JSON'
+        )
+    parser.add_argument(
+        '--ports', metavar='n,n', type=str, default='48,240,684',
+        help='Comma separated --total-ports values'
+        )
+    parser.add_argument(
+        '--runtimes', metavar='n,n', type=str, default='60,3600,86400',
+        help='Comma separated --runtime values'
+        )
+    parser.add_argument(
+        '--engine', type=str, choices=sorted(engines),
+        default='python' if numpy is None else 'numpy',
+        help='Generator engine to time'
+        )
+    parser.add_argument(
+        '--seed', metavar='n', type=int, default=1,
+        help='Seed for every case'
+        )
+    parser.add_argument(
+        '--out', metavar='bench.json', type=str, default='bench.json',
+        help='Where to save the results'
+        )
+    parser.add_argument(
+        '--baseline', metavar='bench.json', type=str, default='',
+        help='Earlier results to compare against'
+        )
+    bench_args = parser.parse_args(argv)
+    if bench_args.engine != 'python' and numpy is None:
+        parser.error('--engine ' + bench_args.engine + ' requires numpy')
+
+    baseline = {}
+    if bench_args.baseline:
+        with open(bench_args.baseline) as previous:
+            for result in json.load(previous)['results']:
+                key = (result['engine'], result['ports'], result['runtime'])
+                baseline[key] = result
+
+    results = []
+    for ports in [int(n) for n in bench_args.ports.split(',')]:
+        for runtime in [int(n) for n in bench_args.runtimes.split(',')]:
+            # A fresh process per case keeps the peak RSS its own
+            with ProcessPoolExecutor(max_workers=1) as pool:
+                result = pool.submit(
+                    bench_case, bench_args.engine, ports, runtime,
+                    bench_args.seed
+                    ).result()
+            results.append(result)
+            line = '{0:>12} {1:>5} ports {2:>8}s  {3:>9.3f}s wall  ' \
+                '{4:>12.1f} sim s/s'.format(
+                    result['engine'], ports, runtime, result['wall'],
+                    result['sim_seconds_per_second']
                     )
-                stats.out_bits_per_sec += (
-                    stats.out_pkts_per_sec * packet_size * 8
+            if result['peak_rss_mb'] is not None:
+                line += '  {0:>8.1f}MB'.format(result['peak_rss_mb'])
+            previous = baseline.get((result['engine'], ports, runtime))
+            if previous:
+                line += '  {0:>6.2f}x'.format(
+                    previous['wall'] / result['wall']
                     )
-                # Utilization In
-                # Automatic Calculation Now
-
-                # Utilization Out
-                # Automatic Calculation Now
-
-        # Inbound Broadcast and Multicast to All standard ports now...
-        for int in range(int_start, int_end + 1):
-            if (int in eth_table.interface_lookup and
-                    (int != uplink1) and
-                    (int != uplink2)):
-                eth_int = eth_table.interfaces[eth_table.interface_lookup[int]]
-                stats = eth_int.interface_stats
-
-                # Broadcast Outbound...
-                # stats.out_pkts += total_in_broadcast_per_sec
-                stats.out_broadcast_pkts += total_in_broadcast_per_sec
-                # Multicast Outbound...
-                # stats.out_pkts += total_in_multicast_per_sec
-                stats.out_multicast_pkts += total_in_multicast_per_sec
-                # Increment Outbound packets per sec
-                stats.out_pkts_per_sec += total_in_broadcast_per_sec
-                stats.out_pkts_per_sec += total_in_multicast_per_sec
+            print(line)
+            print('    ' + '  '.join([
+                '{0} {1:.3f}s'.format(phase, seconds)
+                for phase, seconds in result['phases'].items()
+                ]))
+
+    with open(bench_args.out, 'w') as out_file:
+        json.dump({
+            'version': script_version,
+            'python': sys.version.split()[0],
+            'numpy': None if numpy is None else numpy.__version__,
+            'results': results,
+            }, out_file, indent=2)
+
+
+def bench_case(engine, ports, runtime, seed):
+    # Runs in its own process, quietly, with the phase clock on
+    parser = build_parser()
+    args = parser.parse_args([
+        os.devnull, '--total-ports', str(ports), '--runtime', str(runtime),
+        '--engine', engine, '--seed', str(seed)
+        ])
+    phase_clock.enable()
+    start = time.time()
+    with redirect_stdout(io.StringIO()):
+        generate_switch(args, args.seed)
+    wall = time.time() - start
+    peak_rss = None
+    if resource is not None:
+        # Linux reports kilobytes
+        peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+    return {
+        'engine': engine,
+        'ports': ports,
+        'runtime': runtime,
+        'wall': wall,
+        'sim_seconds_per_second': runtime / wall,
+        'peak_rss_mb': peak_rss,
+        'phases': phase_clock.totals,
+        }
 
-        # Looped Ports Broadcast/Multicast
+
+######
+# Profiling
+###
+class SetterProfile(object):
+    """Interface stats setter calls and clamp hits.
+
+    install() swaps the DefaultInterfaceStats setters and limit methods
+    for counting wrappers, for the rest of the process, so runs without
+    --profile never pay for the counting.
+    """
+
+    limit_methods = (
+        'limit_pkt_per_sec', 'limit_bit_per_sec', 'limit_int_value'
+        )
+
+    def __init__(self):
+        self.installed = False
+        self.setters = {}
+        self.calls = {}
+        self.hits = {}
+
+    def install(self):
+        if self.installed:
+            return
+        self.installed = True
+        cls = DefaultInterfaceStats
+        for name, value in list(vars(cls).items()):
+            if isinstance(value, property) and value.fset is not None:
+                setattr(cls, name, property(
+                    value.fget, self.count_setter(name, value.fset)
+                    ))
+        for name in self.limit_methods:
+            setattr(cls, name, self.count_limit(name, getattr(cls, name)))
+
+    def count_setter(self, name, fset):
+        setters = self.setters
+
+        def setter(stats, value):
+            setters[name] = setters.get(name, 0) + 1
+            fset(stats, value)
+        return setter
+
+    def count_limit(self, name, method):
+        calls = self.calls
+        hits = self.hits
+
+        def limit(stats, value, *limits):
+            calls[name] = calls.get(name, 0) + 1
+            clamped = method(stats, value, *limits)
+            if clamped != value:
+                hits[name] = hits.get(name, 0) + 1
+            return clamped
+        return limit
+
+    def count_array(self, name, values, ceiling):
+        # An array clamp counts as one call per port it covers
+        values = numpy.asarray(values)
+        self.calls[name] = self.calls.get(name, 0) + values.size
+        self.hits[name] = self.hits.get(name, 0) + int(
+            numpy.count_nonzero((values < 0) | (values > ceiling))
+            )
+
+    def count_running(self, name, start, values, ceiling):
+        # A total the ports are added to one at a time through the clamp:
+        # a port's call hits once the total is over the ceiling and it
+        # still adds something
+        values = numpy.asarray(values)
+        reached = start + numpy.cumsum(values)
+        self.calls[name] = self.calls.get(name, 0) + values.size
+        self.hits[name] = self.hits.get(name, 0) + int(
+            numpy.count_nonzero((reached > ceiling) & (values > 0))
+            )
+
+    def report(self):
+        if self.setters:
+            print('Setter calls:')
+            for name, count in sorted(
+                    self.setters.items(), key=lambda item: -item[1]):
+                print('  {0:<24} {1:>12}'.format(name, count))
+        print('Clamps:                         calls         hits')
+        for name in self.limit_methods:
+            print('  {0:<24} {1:>12} {2:>12}'.format(
+                name, self.calls.get(name, 0), self.hits.get(name, 0)
+                ))
+
+
+setter_profile = SetterProfile()
+
+
+def profile_switch(args):
+    """generate_switch() with phase timings, setter and clamp counts."""
+    phase_clock.enable()
+    setter_profile.install()
+    profiler = None
+    start = time.time()
+    if args.profile_stats:
+        profiler = cProfile.Profile()
+        profiler.runcall(generate_switch, args, args.seed)
+    else:
+        generate_switch(args, args.seed)
+    wall = time.time() - start
+
+    print('Profile: {0:.3f}s wall'.format(wall))
+    for phase, seconds in phase_clock.totals.items():
+        print('  {0:<24} {1:>9.3f}s {2:>6.1f}%'.format(
+            phase, seconds, seconds * 100 / wall if wall else 0.0
+            ))
+    setter_profile.report()
+    if profiler is not None:
+        profiler.dump_stats(args.profile_stats)
+        print('cProfile stats written to ' + args.profile_stats)
+        pstats.Stats(profiler, stream=sys.stdout).sort_stats(
+            'tottime'
+            ).print_stats(15)
+
+
+######
+# Random streams
+###
+class SwitchSeeds(object):
+    """Seeds for one switch, split from a single --seed.
+
+    With NumPy the seed becomes a SeedSequence spawning independent
+    children for the setup (which seeds random for main's choices), the
+    per port traffic streams, the engines' own sampling and the
+    impairment draws. Without it
+    the seed goes to random and the traffic is drawn from random in the
+    order the python loop always used. A seed of None draws fresh
+    entropy.
+    """
+
+    def __init__(self, seed):
+        self.sequence = None
+        self.setup = seed
+        if numpy is None:
+            return
+        if not isinstance(seed, numpy.random.SeedSequence):
+            seed = numpy.random.SeedSequence(seed)
+        self.sequence = seed
+        setup, self.traffic, self.engine, self.errors = seed.spawn(4)
+        self.setup = int(setup.generate_state(1, numpy.uint64)[0])
+
+    def streams(self, highs, profiles=None):
+        if self.sequence is None:
+            return ProfiledStreams(RandomStreams(highs), profiles)
+        return ProfiledStreams(PortStreams(self.traffic, highs), profiles)
+
+    def profiles(self, profiles, ports):
+        """PortProfiles of the access ports, or None without profiles."""
+        if not profiles:
+            return None
+        return PortProfiles(profiles, ports, self.traffic)
+
+    def impairments(self, impairments, stats):
+        """PortImpairments of every port, or None without impairments."""
+        if impairments is None:
+            return None
+        return PortImpairments(impairments, stats, self.errors)
+
+    def generator(self):
+        return numpy.random.default_rng(self.engine)
+
+
+def spawn_seeds(seed, count):
+    """Root entropy and one seed per switch for a fleet."""
+    if numpy is None:
+        if seed is None:
+            seed = random.getrandbits(64)
+        return seed, ['{0}-{1}'.format(seed, index) for index in range(count)]
+    root = numpy.random.SeedSequence(seed)
+    return root.entropy, root.spawn(count)
+
+
+def traffic_highs(eth_table, scenario, ports):
+    """Upper bounds of the broadcast, multicast, in and out unicast draws.
+
+    One list per stream with a bound per port, or None for a stream the
+    scenario fixes and so never draws.
+    """
+    table = eth_table
+    stats = [
+        table.interfaces[table.interface_lookup[port]].interface_stats
+        for port in ports
+        ]
+    bcast = mcast = None
+    if scenario.int_broadcast <= -1:
+        bcast = [port_stats.broadcast_limit for port_stats in stats]
+    if scenario.int_multicast == -1:
+        mcast = [port_stats.multicast_limit for port_stats in stats]
+    ucast = []
+    for port_stats in stats:
+        if scenario.int_unicast != -1:
+            high = scenario.int_unicast * multiplier
+        elif (scenario.unicast_max > 0 and
+                scenario.unicast_max < port_stats.speed):
+            high = scenario.unicast_max * multiplier
+        else:
+            high = port_stats.speed * multiplier
+        ucast.append(high // scenario.packet_size)
+    return [bcast, mcast, ucast, ucast]
+
+
+class PortStreams(object):
+    """Random traffic for the access ports, one stream per port.
+
+    Every port draws from its own generator, spawned from the switch's
+    traffic seed, stream_block seconds at a time: broadcast, multicast,
+    in and out unicast in that order, skipping streams the scenario
+    fixes. take() hands out the next seconds for every port, so the
+    values do not depend on how many seconds an engine asks for at once
+    and every engine that steps second by second sees the same traffic.
+    """
+
+    def __init__(self, sequence, highs):
+        self.highs = highs
+        self.ports = len(highs[2])
+        self.generators = [
+            numpy.random.default_rng(child)
+            for child in sequence.spawn(self.ports)
+            ]
+        self.block = [None] * len(highs)
+        self.offset = stream_block
+
+    def refill(self):
+        block = [
+            None if high is None else
+            numpy.empty((stream_block, self.ports), dtype=numpy.int64)
+            for high in self.highs
+            ]
+        for column, generator in enumerate(self.generators):
+            for stream, high in enumerate(self.highs):
+                if high is not None:
+                    block[stream][:, column] = generator.integers(
+                        0, high[column], size=stream_block, endpoint=True
+                        )
+        self.block = block
+        self.offset = 0
+
+    def take(self, seconds):
+        """The next seconds of each stream as (seconds, ports) arrays."""
+        parts = []
+        while seconds > 0:
+            if self.offset == stream_block:
+                self.refill()
+            count = min(seconds, stream_block - self.offset)
+            end = self.offset + count
+            parts.append([
+                None if values is None else values[self.offset:end]
+                for values in self.block
+                ])
+            self.offset = end
+            seconds -= count
+        if len(parts) == 1:
+            return parts[0]
+        return [
+            None if part[0] is None else numpy.concatenate(part)
+            for part in zip(*parts)
+            ]
+
+    def take_rows(self, seconds):
+        """Like take() with every stream as lists of Python ints."""
+        return [
+            None if values is None else values.tolist()
+            for values in self.take(seconds)
+            ]
+
+
+class RandomStreams(object):
+    # PortStreams stand-in without NumPy, drawing from random port by port
+    # and second by second like the python loop always has
+
+    def __init__(self, highs):
+        self.highs = highs
+        self.ports = len(highs[2])
+
+    def take_rows(self, seconds):
+        randint = random.randint
+        rows = [None if high is None else [] for high in self.highs]
+        for second in range(seconds):
+            drawn = [None if high is None else [] for high in self.highs]
+            for column in range(self.ports):
+                for stream, high in enumerate(self.highs):
+                    if high is not None:
+                        drawn[stream].append(randint(0, high[column]))
+            for stream, values in enumerate(drawn):
+                if values is not None:
+                    rows[stream].append(values)
+        return rows
+
+
+######
+# Impairments
+###
+class Impairments(object):
+    """Physical layer errors, --bit-error-rate and --half-duplex.
+
+    frame_error is the chance a frame of packet_size octets takes at least
+    one bit error. A half duplex port's frames collide with
+    collision_rate chance while its link is fully loaded, and
+    proportionally less while it is not.
+    """
+
+    def __init__(self, bit_error_rate, collision_rate, packet_size):
+        self.frame_error = 1.0 - (1.0 - bit_error_rate) ** (packet_size * 8)
+        self.collision_rate = collision_rate
+        self.packet_size = packet_size
+
+
+class PortImpairments(object):
+    """Error counters of every port, drawn in bulk as they are read.
+
+    Only the frames each port received and sent since the last read are
+    needed, so rather than rolling for errors every second the errors of
+    the whole stretch are drawn at once: CRC errors as a binomial over
+    the frames received, and on half duplex ports collisions over the
+    frames sent and fragments of the station's collided frames over the
+    received frames left without a CRC error, with late collisions a
+    share of the collisions. A read costs a few array draws however many
+    seconds it covers.
+    """
+
+    def __init__(self, impairments, stats, sequence):
+        self.impairments = impairments
+        self.rng = numpy.random.default_rng(sequence)
+        self.half = numpy.array(
+            [port_stats.duplex == "Half" for port_stats in stats]
+            )
+        self.ceiling = numpy.array([
+            max(port_stats.speed * multiplier //
+                (impairments.packet_size * 8), 1)
+            for port_stats in stats
+            ], dtype=float)
+        self.elapsed = 0
+        self.received = numpy.zeros(len(stats), dtype=object)
+        self.sent = numpy.zeros(len(stats), dtype=object)
+
+    def draw(self, elapsed, in_pkts, out_pkts):
+        """(field, values) of each port's errors since the last read."""
+        in_pkts = numpy.array(in_pkts, dtype=object)
+        out_pkts = numpy.array(out_pkts, dtype=object)
+        received = (in_pkts - self.received).astype(numpy.int64)
+        sent = (out_pkts - self.sent).astype(numpy.int64)
+        capacity = max(elapsed - self.elapsed, 1) * self.ceiling
+        self.elapsed = elapsed
+        self.received = in_pkts
+        self.sent = out_pkts
+
+        rng = self.rng
+        collide = self.impairments.collision_rate * self.half
+        crc = rng.binomial(received, self.impairments.frame_error)
+        # A frame is counted once, as a CRC error or as a fragment
+        fragments = rng.binomial(
+            received - crc, collide * numpy.minimum(received / capacity, 1.0)
+            )
+        collisions = rng.binomial(
+            sent, collide * numpy.minimum(sent / capacity, 1.0)
+            )
+        late = rng.binomial(collisions, late_collision_share)
+        return (
+            ('crc_errors', crc),
+            ('in_bad_fragments', fragments),
+            ('in_errors', crc + fragments),
+            ('collisions', collisions),
+            ('late_collisions', late),
+            )
+
+
+######
+# Traffic profiles
+###
+class TrafficProfile(object):
+    """Rate curve a group of ports follows, --traffic-profile.
+
+    curve() gives the share of the ports' unicast ceiling in use each
+    second, from 0 to 1. flat, diurnal (a sinusoid between low and high
+    peaking at peak seconds into each period), steps (second=share
+    pairs) and bursts (on seconds at high, off seconds at low) follow the
+    clock. poisson (unit times a Poisson count of flows) and pareto (a
+    heavy tailed multiple of scale) are drawn profile_chunk seconds at a
+    time from a generator keyed by the chunk, so each second's value is
+    the same however the engine steps through them. ports is None for
+    every access port.
+    """
+    defaults = {
+        'flat': {'scale': 1.0},
+        'diurnal': {'low': 0.2, 'high': 1.0, 'period': 86400.0,
+                    'peak': 50400.0},
+        'steps': {},
+        'bursts': {'on': 10.0, 'off': 50.0, 'high': 1.0, 'low': 0.05},
+        'poisson': {'mean': 4.0, 'unit': 0.1},
+        'pareto': {'alpha': 1.5, 'scale': 0.1},
+        }
+
+    def __init__(self, kind, params, steps=(), ports=None):
+        self.kind = kind
+        self.params = params
+        self.steps = sorted(steps)
+        self.ports = ports
+        self.chunk = (None, None)
+
+    def curve(self, start, count, seed=None):
+        p = self.params
+        t = numpy.arange(start, start + count, dtype=float)
+        if self.kind == 'flat':
+            values = numpy.full(count, p['scale'])
+        elif self.kind == 'diurnal':
+            phase = 2 * numpy.pi * (t - p['peak']) / p['period']
+            values = p['low'] + (p['high'] - p['low']) * (
+                1 + numpy.cos(phase)) / 2
+        elif self.kind == 'steps':
+            # Full rate until the first step
+            seconds = [second for second, share in self.steps]
+            shares = numpy.array(
+                [1.0] + [share for second, share in self.steps]
+                )
+            values = shares[numpy.searchsorted(seconds, t, side='right')]
+        elif self.kind == 'bursts':
+            on = t % (p['on'] + p['off']) < p['on']
+            values = numpy.where(on, p['high'], p['low'])
+        else:
+            values = numpy.empty(count)
+            for chunk in range(start // profile_chunk,
+                               (start + count - 1) // profile_chunk + 1):
+                first = max(start, chunk * profile_chunk)
+                last = min(start + count, (chunk + 1) * profile_chunk)
+                offset = chunk * profile_chunk
+                values[first - start:last - start] = self.draw_chunk(
+                    chunk, seed)[first - offset:last - offset]
+        return numpy.clip(values, 0.0, 1.0)
+
+    def draw_chunk(self, chunk, seed):
+        if self.chunk[0] == chunk:
+            return self.chunk[1]
+        p = self.params
+        rng = numpy.random.default_rng(numpy.random.SeedSequence(
+            seed.entropy, spawn_key=seed.spawn_key + (chunk,)
+            ))
+        if self.kind == 'poisson':
+            values = p['unit'] * rng.poisson(p['mean'], profile_chunk)
+        else:
+            values = p['scale'] * (1 + rng.pareto(p['alpha'], profile_chunk))
+        self.chunk = (chunk, values)
+        return values
+
+
+def parse_traffic_profile(text):
+    """TrafficProfile of a "kind[:key=value,...][@ports]" option."""
+    spec, at, ports = text.partition('@')
+    kind, colon, settings = spec.partition(':')
+    kind = kind.strip()
+    if kind not in TrafficProfile.defaults:
+        raise ValueError('unknown traffic profile ' + repr(kind))
+    params = dict(TrafficProfile.defaults[kind])
+    steps = []
+    for setting in settings.split(','):
+        if not setting.strip():
+            continue
+        key, equals, value = setting.partition('=')
+        key = key.strip()
+        try:
+            value = float(value)
+            if kind == 'steps':
+                steps.append((int(key), value))
+                continue
+        except ValueError:
+            raise ValueError('bad traffic profile setting ' + repr(setting))
+        if key not in params:
+            raise ValueError(
+                'traffic profile ' + kind + ' has no setting ' + repr(key)
+                )
+        params[key] = value
+    if kind == 'diurnal' and params['period'] <= 0:
+        raise ValueError('diurnal period must be above 0')
+    if kind == 'bursts' and (min(params['on'], params['off']) < 0 or
+                             params['on'] + params['off'] <= 0):
+        raise ValueError('bursts need on and off seconds')
+    if kind == 'pareto' and params['alpha'] <= 0:
+        raise ValueError('pareto alpha must be above 0')
+    if kind == 'poisson' and params['mean'] < 0:
+        raise ValueError('poisson mean must be 0 or more')
+    if ports.strip():
+        ports = parse_port_list(ports)
+    else:
+        ports = None
+    return TrafficProfile(kind, params, steps, ports)
+
+
+class PortProfiles(object):
+    """The traffic profiles of the access ports, as arrays.
+
+    Each port follows the last profile naming it, or a flat curve of 1.
+    Every profile's curve is worked out once per run of seconds and
+    spread to its ports by index, so the cost is per profile and block
+    of seconds rather than per port and second.
+    """
+
+    def __init__(self, profiles, ports, sequence):
+        self.profiles = profiles
+        self.seeds = sequence.spawn(len(profiles))
+        self.index = numpy.full(len(ports), len(profiles), dtype=numpy.intp)
+        position = dict((port, n) for n, port in enumerate(ports))
+        for n, profile in enumerate(profiles):
+            if profile.ports is None:
+                self.index[:] = n
+                continue
+            for port in profile.ports:
+                if port in position:
+                    self.index[position[port]] = n
+
+    def curves(self, start, count):
+        """(count, profiles + 1) shares, the last column the flat one."""
+        columns = [
+            profile.curve(start, count, seed)
+            for profile, seed in zip(self.profiles, self.seeds)
+            ]
+        columns.append(numpy.ones(count))
+        return numpy.stack(columns, axis=1)
+
+    def scale(self, start, count):
+        """Each port's share for count seconds from start."""
+        return self.curves(start, count)[:, self.index]
+
+    def window_sums(self, start, count):
+        """Sum and sum of squares of each port's share over a stretch."""
+        total = numpy.zeros(len(self.profiles) + 1)
+        squares = numpy.zeros(len(self.profiles) + 1)
+        for first in range(start, start + count, profile_window):
+            curves = self.curves(
+                first, min(profile_window, start + count - first)
+                )
+            total += curves.sum(axis=0)
+            squares += (curves * curves).sum(axis=0)
+        return total[self.index], squares[self.index]
+
+    def edges(self, ports, runtime):
+        """Seconds where the share of any of the ports changes.
+
+        Only steps and bursts profiles hold their share between edges;
+        None if one of the ports follows a profile that moves every
+        second.
+        """
+        edges = set()
+        for n in numpy.unique(self.index[ports]):
+            if n == len(self.profiles):
+                continue
+            profile = self.profiles[n]
+            p = profile.params
+            if profile.kind == 'steps':
+                edges.update(second for second, share in profile.steps)
+            elif profile.kind == 'bursts':
+                period = p['on'] + p['off']
+                for start in numpy.arange(0, runtime, period):
+                    edges.add(int(numpy.ceil(start)))
+                    edges.add(int(numpy.ceil(start + p['on'])))
+            elif profile.kind != 'flat':
+                return None
+        return sorted(second for second in edges if 0 < second < runtime)
+
+
+class ProfiledStreams(object):
+    """The engines' streams, the unicast draws scaled by the port profiles.
+
+    The streams underneath always carry on where they left off and
+    cannot be moved; only the profiles read the second a draw starts at,
+    and without profiles the draws pass straight through.
+    """
+
+    def __init__(self, streams, profiles):
+        self.streams = streams
+        self.profiles = profiles
+
+    def take(self, seconds, start):
+        drawn = self.streams.take(seconds)
+        if self.profiles is None:
+            return drawn
+        scale = self.profiles.scale(start, seconds)
+        return drawn[:2] + [
+            numpy.rint(values * scale).astype(numpy.int64)
+            for values in drawn[2:]
+            ]
+
+    def take_rows(self, seconds, start):
+        if self.profiles is None:
+            return self.streams.take_rows(seconds)
+        return [
+            None if values is None else values.tolist()
+            for values in self.take(seconds, start)
+            ]
+
+
+def python_engine(eth_table, scenario, seeds, snapshots=None):
+    uplink1 = scenario.uplink1
+    uplink2 = scenario.uplink2
+    loop1 = scenario.loop1
+    loop2 = scenario.loop2
+    loop_after = scenario.loop_after
+    runtime = scenario.runtime
+    packet_size = scenario.packet_size
+    int_broadcast = scenario.int_broadcast
+    int_multicast = scenario.int_multicast
+    uplink1_int = eth_table.interfaces[eth_table.interface_lookup[uplink1]]
+    uplink2_int = eth_table.interfaces[eth_table.interface_lookup[uplink2]]
+    # Dense index of the active ports, idle ones are never visited
+    active_interfaces = [
+        eth_table.interfaces[eth_table.interface_lookup[int]]
+        for int in scenario.active
+        ]
+    access_ports = [
+        int for int in scenario.active
+        if (int in eth_table.interface_lookup and
+            (int != uplink1) and
+            (int != uplink2))
+        ]
+    streams = seeds.streams(
+        traffic_highs(eth_table, scenario, access_ports),
+        seeds.profiles(scenario.profiles, access_ports)
+        )
+    # Uplink each access port feeds and the counters it has fed so far
+    feeds = [
+        (uplink1_int, uplink2_int)[uplink_feed(scenario, position)]
+        for position in range(len(access_ports))
+        ]
+    folded = [[0] * len(aggregate_fields) for port in access_ports]
+    domains = scenario.domains
+    groups = scenario.multicast
+    ingress = domains.ingress
+    group_ingress = groups.ingress
+    position_of = dict((int, n) for n, int in enumerate(access_ports))
+    storm = None
+    if scenario.loop_model == 'storm' and (loop1 > 0 or loop2 > 0):
+        storm = LoopStorm(scenario.storm_gain, [
+            (loop, ingress[position_of[loop]] if loop in position_of
+             else None)
+            for loop in (loop1, loop2) if loop > 0
+            ])
+    impairments = seeds.impairments(
+        scenario.impairments,
+        [eth_int.interface_stats for eth_int in active_interfaces]
+        )
+
+    # Broadcast received per flooding domain, multicast per group
+    total_in_broadcast_per_sec = [0] * domains.count
+    total_in_multicast_per_sec = [0] * groups.count
+
+    # Packet Generator Loop
+    for i in range(0, runtime):
+        phase_clock.switch('generation')
+        if i % stream_block == 0:
+            drawn = streams.take_rows(min(stream_block, runtime - i), i)
+        draws = [None if rows is None else rows[i % stream_block]
+                 for rows in drawn]
+        column = 0
+
+        if loop1 == 0 and loop2 == 0:
+            total_in_broadcast_per_sec = [0] * domains.count
+            total_in_multicast_per_sec = [0] * groups.count
+        # Reset Uplink per second stats
+        reset_per_sec(uplink1_int.interface_stats)
+        reset_per_sec(uplink2_int.interface_stats)
+        # RSTP hellos are added as the counters are read, add_hellos()
+
+        # Main Work Area, over the active access ports only
+        for int in access_ports:
+            eth_int = eth_table.interfaces[eth_table.interface_lookup[int]]
+            stats = eth_int.interface_stats
+
+            stats.packet_size = packet_size
+            # Reset the per second stats every run
+            reset_per_sec(stats)
+
+            # Calculate broadcast first to prevent exclusion
+            # if (int != loop1) and (int != loop2):
+            if int_broadcast <= -1:
+                random_broadcast = draws[0][column]
+                stats.in_broadcast_pkts += random_broadcast
+                total_in_broadcast_per_sec[ingress[column]] += (
+                    random_broadcast)
+            else:
+                # stats.in_pkts += int_broadcast
+                stats.in_broadcast_pkts += int_broadcast
+                total_in_broadcast_per_sec[ingress[column]] += (
+                    int_broadcast)
+            # Calculate multicast second to prevent exclusion
+            if int_multicast == -1:
+                random_multicast = draws[1][column]
+                stats.in_multicast_pkts += random_multicast
+                total_in_multicast_per_sec[group_ingress[column]] += (
+                    random_multicast)
+                stats.in_pkts_per_sec += random_multicast
+            else:
+                # stats.in_pkts += int_multicast
+                stats.in_multicast_pkts += int_multicast
+                total_in_multicast_per_sec[group_ingress[column]] += (
+                    int_multicast)
+                stats.in_pkts_per_sec += int_multicast
+            # Unicast up to traffic_highs(), the line rate by default
+            in_pkts = draws[2][column]
+            out_pkts = draws[3][column]
+            # stats.in_pkts += in_pkts
+            stats.in_unicast_pkts += in_pkts
+            # stats.in_octets += (in_pkts * packet_size)
+            in_offered = stats.in_pkts_per_sec + in_pkts
+            stats.in_pkts_per_sec += in_pkts
+            if scenario.discards:
+                # Input over the line rate is dropped
+                add_errors(
+                    stats, folded[column], 'in_discards',
+                    in_offered - stats.in_pkts_per_sec
+                    )
+            column += 1
+            # stats.out_pkts += out_pkts
+            stats.out_unicast_pkts += out_pkts
+            # stats.out_octets += (out_pkts * packet_size)
+            stats.out_pkts_per_sec += out_pkts
+            stats.in_bits_per_sec += (
+                stats.in_pkts_per_sec * packet_size * 8
+                )
+            stats.out_bits_per_sec += (
+                stats.out_pkts_per_sec * packet_size * 8
+                )
+            # Utilization In
+            # Automatic Calculation Now
+
+            # Utilization Out
+            # Automatic Calculation Now
+
+        # Inbound Broadcast and Multicast to the ports of each domain
+        phase_clock.switch('fan-out')
+        flood = []
+        for position, int in enumerate(access_ports):
+            eth_int = eth_table.interfaces[eth_table.interface_lookup[int]]
+            stats = eth_int.interface_stats
+            broadcast = domains.flood(total_in_broadcast_per_sec, position)
+            multicast = groups.flood(total_in_multicast_per_sec, position)
+            flood.append((broadcast, multicast))
+
+            # Broadcast Outbound...
+            stats.out_broadcast_pkts += broadcast
+            # Multicast Outbound...
+            stats.out_multicast_pkts += multicast
+            # Increment Outbound packets per sec
+            stats.out_pkts_per_sec += broadcast
+            stats.out_pkts_per_sec += multicast
+
+        # RSTP topology changes flood what the flushed MAC tables held
+        for when, kind, port in scenario.rstp.due(i):
+            rstp_event(
+                eth_table, scenario, access_ports, position_of, folded,
+                kind, port, draws[2]
+                )
+
+        # Looped Ports Broadcast/Multicast, an access port gets its own
+        # domains' flood back and an uplink every domain's
+        phase_clock.switch('loop-injection')
         if i >= loop_after:
-            if loop1 > 0:
-                loop1_int = eth_table.interfaces[
-                    eth_table.interface_lookup[loop1]
+            inject = 0
+            ceilings = []
+            for loop in (loop1, loop2):
+                if loop <= 0:
+                    continue
+                loop_int = eth_table.interfaces[
+                    eth_table.interface_lookup[loop]
                     ]
+                if loop in position_of:
+                    broadcast, multicast = flood[position_of[loop]]
+                else:
+                    broadcast = sum(total_in_broadcast_per_sec)
+                    multicast = sum(total_in_multicast_per_sec)
+                if storm is not None:
+                    # The broadcast joins the storm instead
+                    inject += broadcast
+                    broadcast = 0
                 loop_interface_stats_manual(
-                    loop1_int,
-                    total_in_broadcast_per_sec,
-                    total_in_multicast_per_sec,
-                    stats.packet_size
+                    loop_int, broadcast, multicast, packet_size
                     )
-            if loop2 > 0:
-                loop2_int = eth_table.interfaces[
-                    eth_table.interface_lookup[loop2]
-                    ]
-                loop_interface_stats_manual(
-                    loop2_int,
-                    total_in_broadcast_per_sec,
-                    total_in_multicast_per_sec,
-                    stats.packet_size
+                ceilings.append(storm_ceiling(
+                    loop_int.interface_stats.pkt_ceiling,
+                    loop_int.interface_stats.broadcast_limit
+                    ))
+            if storm is not None:
+                loop_storm_stats(
+                    eth_table, scenario, access_ports, storm,
+                    storm.step(inject, min(ceilings))
                     )
 
         # Aggregate for looped ports and uplinks
-        for int in range(int_start, int_end + 1):
-            if ((int != uplink1) and
-                    (int != uplink2)):
-                # and
-                # (int != loop1) and
-                # (int != loop2)
-                eth_int = eth_table.interfaces[eth_table.interface_lookup[int]]
-                stats.speed = eth_int.interface_stats.speed
-
-                # Statistics Generation
-                # Switch originated traffic
-                aggregate_interface_stats(eth_int, uplink1_int)
-                # aggregate_interface_stats(eth_int, uplink2_int)
-
-        # Uplink 1 - Primary
-        stats = uplink1_int.interface_stats
-
-        # Uplink 2 - Secondary
-        stats = uplink2_int.interface_stats
+        phase_clock.switch('aggregation')
+        for position, int in enumerate(access_ports):
+            eth_int = eth_table.interfaces[eth_table.interface_lookup[int]]
+
+            # Statistics Generation
+            # Switch originated traffic
+            aggregate_interface_stats(
+                eth_int, feeds[position], folded[position]
+                )
+
+        if snapshots is not None and snapshots.due(i + 1):
+            add_hellos(eth_table, scenario, position_of, folded, i + 1)
+            add_impairments(
+                active_interfaces, position_of, folded, impairments, i + 1
+                )
+            snapshots.emit(i + 1)
+    add_hellos(eth_table, scenario, position_of, folded, runtime)
+    add_impairments(
+        active_interfaces, position_of, folded, impairments, runtime
+        )
 
-    # OUTPUT
-    # try:
-    out_file = open(args.out_file, 'wb')
-    out_line = ""
-    for int in range(0, len(eth_table.interfaces)):
-        out_line += (interface_print(eth_table.interfaces[int]))
 
-    out_file.write(out_line)
+def add_bpdus(eth_table, position_of, folded, port, in_bpdus, out_bpdus):
+    # BPDUs are link local, an access port's are marked as already folded
+    # into its uplink so they are never aggregated. position_of maps the
+    # access ports to their position in folded.
+    eth_table.interfaces[
+        eth_table.interface_lookup[port]
+        ].interface_stats.add_bpdus(in_bpdus, out_bpdus)
+    position = position_of.get(port)
+    if position is not None:
+        folded[position][bpdu_folded[0]] += in_bpdus
+        folded[position][bpdu_folded[1]] += out_bpdus
+
+
+def add_hellos(eth_table, scenario, position_of, folded, elapsed):
+    rstp = scenario.rstp
+    hellos = rstp.hellos(elapsed)
+    if not hellos:
+        return
+    for port in scenario.active:
+        if port in rstp.receivers:
+            add_bpdus(eth_table, position_of, folded, port, hellos, 0)
+        else:
+            add_bpdus(eth_table, position_of, folded, port, 0, hellos)
+
+
+def add_errors(stats, folded, name, errors):
+    # A link's errors stay on it, an access port's are marked as already
+    # folded into its uplink like BPDUs
+    setattr(stats, name, getattr(stats, name) + errors)
+    if folded is not None:
+        folded[folded_index[name]] += errors
+
+
+def add_impairments(interfaces, position_of, folded, impairments, elapsed):
+    if impairments is None:
+        return
+    stats = [eth_int.interface_stats for eth_int in interfaces]
+    errors = impairments.draw(
+        elapsed,
+        [port_stats.in_pkts for port_stats in stats],
+        [port_stats.out_pkts for port_stats in stats]
+        )
+    for name, values in errors:
+        for eth_int, value in zip(interfaces, values.tolist()):
+            position = position_of.get(eth_int.interfaceID)
+            add_errors(
+                eth_int.interface_stats,
+                None if position is None else folded[position],
+                name, value
+                )
+
+
+def rstp_event(eth_table, scenario, access_ports, position_of, folded, kind,
+               port, unicast):
+    stats = eth_table.interfaces[
+        eth_table.interface_lookup[port]
+        ].interface_stats
+    if kind == 'settle':
+        stats.state = "Forward"
+        return
+    stats.state = "Blocked"
+    # TC BPDUs from every other active port
+    for other in scenario.active:
+        if other != port:
+            add_bpdus(
+                eth_table, position_of, folded, other, 0, rstp_tc_bpdus
+                )
+    # The MAC tables are flushed, so this second's unicast floods each
+    # domain like broadcast
+    domains = scenario.domains
+    totals = [0] * domains.count
+    for position in range(len(access_ports)):
+        totals[domains.ingress[position]] += unicast[position]
+    for position, int in enumerate(access_ports):
+        port_stats = eth_table.interfaces[
+            eth_table.interface_lookup[int]
+            ].interface_stats
+        flush = domains.flood(totals, position)
+        port_stats.out_unicast_pkts += flush
+        port_stats.out_pkts_per_sec += flush
 
 
 def reset_per_sec(stats):
@@ -1051,32 +2954,84 @@ def loop_interface_stats(int_from, int_to):
     return
 
 
-def aggregate_interface_stats(int_from, int_to):
+def storm_ceiling(pkt_ceiling, broadcast_limit):
+    # Storm control holds a looped port to its broadcast limit, 0 is off
+    if broadcast_limit > 0:
+        return min(pkt_ceiling, broadcast_limit)
+    return pkt_ceiling
+
+
+class LoopStorm(object):
+    """Broadcast circulating in a bridge loop, for --loop-model storm.
+
+    Every second each frame in the loop comes round again gain times over
+    and the broadcast flooded into the looped ports that second joins it,
+    up to the ceiling of the slowest looped port. gain is at least 1, so
+    once a storm reaches the ceiling it stays there. loops pairs each
+    looped port with the flooding domain it feeds, None for an uplink.
+    """
+
+    def __init__(self, gain, loops=()):
+        self.gain = gain
+        self.rate = 0
+        self.loops = loops
+        self.looped = set(
+            loop for loop, domain in loops if domain is not None
+            )
+
+    def step(self, inject, ceiling):
+        self.rate = min(int(self.rate * self.gain) + inject, ceiling)
+        return self.rate
+
+
+def loop_storm_stats(eth_table, scenario, access_ports, storm, rate):
+    # The looped ports carry the storm both ways and flood it to every
+    # other port of their domains (an uplink to every domain)
+    domains = scenario.domains
+    totals = [0] * domains.count
+    looped = storm.looped
+    for loop, domain in storm.loops:
+        stats = eth_table.interfaces[
+            eth_table.interface_lookup[loop]
+            ].interface_stats
+        if domain is not None:
+            totals[domain] += rate
+            stats.add_storm(rate, 0)
+        else:
+            totals = [total + rate for total in totals]
+            stats.add_storm(rate, rate)
+    for position, int in enumerate(access_ports):
+        stats = eth_table.interfaces[
+            eth_table.interface_lookup[int]
+            ].interface_stats
+        if int in looped:
+            stats.add_storm(0, rate)
+        else:
+            stats.add_storm(0, min(
+                domains.flood(totals, position), stats.pkt_ceiling
+                ))
+
+
+def uplink_feed(scenario, position):
+    # 0 for uplink1, 1 for uplink2; lacp alternates the access ports
+    # between them, active-standby leaves uplink2 idle
+    if scenario.uplink_mode == 'lacp':
+        return position % 2
+    return 0
+
+
+def aggregate_interface_stats(int_from, int_to, folded):
+    # Adds what int_from's counters grew by since the last call, folded
+    # holds their aggregate_fields values from then and is updated
     stats_in = int_from.interface_stats
     stats_out = int_to.interface_stats
-    #
-    #stats_out.out_octets += stats_in.in_octets
-    #stats_out.in_octets += stats_in.out_octets
-    #stats_out.out_pkts += stats_in.in_pkts
-    #stats_out.in_pkts += stats_in.out_pkts
-    stats_out.out_broadcast_pkts += stats_in.out_broadcast_pkts
-    stats_out.in_broadcast_pkts += stats_in.in_broadcast_pkts
-    stats_out.out_multicast_pkts += stats_in.out_multicast_pkts
-    stats_out.in_multicast_pkts += stats_in.in_multicast_pkts
-    stats_out.out_unicast_pkts += stats_in.in_unicast_pkts
-    stats_out.in_unicast_pkts += stats_in.out_unicast_pkts
-    #
-    stats_out.in_good_fragments += stats_in.in_good_fragments
-    stats_out.in_bad_fragments += stats_in.in_bad_fragments
-    stats_out.in_discards += stats_in.in_discards
-    stats_out.in_errors += stats_in.in_errors
-    stats_out.collisions += stats_in.collisions
-    stats_out.late_collisions += stats_in.late_collisions
-    stats_out.crc_errors += stats_in.crc_errors
-    stats_out.mac_rx_errors += stats_in.mac_rx_errors
-    stats_out.giant_pkts += stats_in.giant_pkts
-    stats_out.short_pkts += stats_in.short_pkts
-    stats_out.jabber += stats_in.jabber
+    for index, (uplink_field, port_field) in enumerate(aggregate_fields):
+        value = getattr(stats_in, port_field)
+        setattr(
+            stats_out, uplink_field,
+            getattr(stats_out, uplink_field) + value - folded[index]
+            )
+        folded[index] = value
     stats_out.out_bits_per_sec += stats_in.in_bits_per_sec
     stats_out.in_bits_per_sec += stats_in.out_bits_per_sec
     stats_out.out_pkts_per_sec += stats_in.in_pkts_per_sec
@@ -1087,52 +3042,1468 @@ def aggregate_interface_stats(int_from, int_to):
     return
 
 
-def interface_print(interface):
+class PortLimits(object):
+    """Line rate clamps of the array engines' access ports.
+
+    The ports are grouped by speed and packet size and the packet and
+    bit ceilings worked out once per group with line_rate(), then spread
+    to the ports by their group, again only through set_packet_size().
+    packets() and bits() clamp a value per port for a whole array of
+    ports at once, like limit_pkt_per_sec() and limit_bit_per_sec(), and
+    count how often they fire while --profile is on. clamp() and
+    running() do the same for the uplinks' ceilings, so the clamp counts
+    mean the same on every engine.
+    """
+
+    def __init__(self, speed, packet_size):
+        self.speed = numpy.array(speed, dtype=numpy.int64)
+        self.set_packet_size(packet_size)
+
+    def set_packet_size(self, packet_size):
+        self.packet_size = numpy.array(packet_size, dtype=numpy.int64)
+        pairs = numpy.stack([self.speed, self.packet_size], axis=1)
+        groups, group = numpy.unique(pairs, axis=0, return_inverse=True)
+        self.group = group.reshape(-1)
+        ceilings = numpy.array(
+            [line_rate(speed, size) for speed, size in groups.tolist()],
+            dtype=numpy.int64
+            ).reshape(-1, 2)
+        self.bit_ceiling = ceilings[self.group, 0]
+        self.pkt_ceiling = ceilings[self.group, 1]
+
+    def packets(self, values, ports=slice(None)):
+        ceiling = self.pkt_ceiling[ports]
+        if setter_profile.installed:
+            setter_profile.count_array('limit_pkt_per_sec', values, ceiling)
+        return numpy.clip(values, 0, ceiling)
+
+    def bits(self, values, ports=slice(None)):
+        ceiling = self.bit_ceiling[ports]
+        if setter_profile.installed:
+            setter_profile.count_array('limit_bit_per_sec', values, ceiling)
+        return numpy.clip(values, 0, ceiling)
+
+    def clamp(self, name, values, ceiling):
+        """Clamp values to an uplink's ceiling, counted as name."""
+        if setter_profile.installed:
+            setter_profile.count_array(name, values, ceiling)
+        return numpy.clip(values, 0, ceiling)
+
+    def running(self, name, start, values, total, ceiling):
+        """An uplink value after adding each port's value through name.
+
+        Adding the ports one at a time, clamping after each, ends at
+        start plus their total, the sum of values, up to the ceiling.
+        """
+        if setter_profile.installed:
+            setter_profile.count_running(name, start, values, ceiling)
+        return min(start + total, ceiling)
+
+
+class FloodIndex(object):
+    """Array form of FloodDomains or MulticastGroups for the array engines.
+
+    egress holds every port's domains back to back and egress_start where
+    each port's run begins, so the flood of all ports is one add.reduceat
+    over the memberships. Ports without any (no group joined) are left
+    out of the reduce and get 0.
+    """
+
+    def __init__(self, domains):
+        self.count = domains.count
+        self.ingress = numpy.array(domains.ingress, dtype=numpy.intp)
+        self.egress = None
+        if not domains.simple:
+            self.egress = numpy.array(
+                [domain for egress in domains.egress for domain in egress],
+                dtype=numpy.intp
+                )
+            lengths = numpy.array(
+                [len(egress) for egress in domains.egress], dtype=numpy.intp
+                )
+            self.joined = lengths > 0
+            self.egress_start = (numpy.cumsum(lengths) - lengths)[self.joined]
+
+    def zeros(self):
+        return numpy.zeros(self.count, dtype=numpy.int64)
+
+    def totals(self, values):
+        """Per domain sums of one value per access port."""
+        if self.count == 1:
+            return values.sum()
+        totals = self.zeros()
+        numpy.add.at(totals, self.ingress, values)
+        return totals
+
+    def flood(self, totals):
+        """What each access port is flooded with, from the domain totals."""
+        if self.egress is None:
+            return totals[self.ingress]
+        flood = numpy.zeros(len(self.ingress), dtype=totals.dtype)
+        if len(self.egress):
+            flood[self.joined] = numpy.add.reduceat(
+                totals[self.egress], self.egress_start
+                )
+        return flood
+
+
+class NumpyEngine(object):
+    """Array backed equivalent of python_engine().
+
+    Every access port's counters live in one (fields, ports) int64 array
+    and the random broadcast/multicast/unicast values are drawn for a
+    block of seconds at a time. Each second is then a handful of array
+    operations that apply the same clamps as the DefaultInterfaceStats
+    setters. Uplinks stay as rows of Python ints since they total the
+    counters of many access ports and can outgrow int64; each second they
+    only take the growth of the port counters since the previous second.
+    """
+
+    def __init__(self, eth_table, scenario, seeds=None, snapshots=None):
+        self.eth_table = eth_table
+        self.scenario = scenario
+        self.snapshots = snapshots
+        if seeds is None:
+            seeds = SwitchSeeds(None)
+        self.rng = seeds.generator()
+
+        uplinks = [scenario.uplink1]
+        if scenario.uplink2 != scenario.uplink1:
+            uplinks.append(scenario.uplink2)
+        self.uplink_ports = uplinks
+        self.uplink_of = dict((port, u) for u, port in enumerate(uplinks))
+        self.uplink1 = 0
+        self.uplink2 = self.uplink_of[scenario.uplink2]
+        # Dense index of the active access ports, idle ones keep their
+        # zero counters and never take a column
+        self.access_ports = [
+            port for port in scenario.active if port not in uplinks
+            ]
+        self.column_of = dict(
+            (port, column) for column, port in enumerate(self.access_ports)
+            )
+        access_stats = [self.port_stats(port) for port in self.access_ports]
+        self.uplink_stats = [self.port_stats(port) for port in uplinks]
+
+        self.counters = numpy.zeros(
+            (len(counter_fields), len(access_stats)), dtype=numpy.int64
+            )
+        for row, name in enumerate(counter_fields):
+            self.counters[row] = [
+                getattr(stats, '_' + name) for stats in access_stats
+                ]
+        self.uplinks = [
+            [getattr(stats, '_' + name) for name in counter_fields]
+            for stats in self.uplink_stats
+            ]
+        self.uplink_packet_size = [
+            stats.packet_size for stats in self.uplink_stats
+            ]
+        self.wide = False
+        # Port counters already added to the uplinks, by aggregate_rows
+        self.folded = numpy.zeros(
+            (len(aggregate_rows), len(access_stats)), dtype=numpy.int64
+            )
+        self.folded_rows = [port for uplink, port in aggregate_rows]
+        # (uplink, access ports) each uplink collects from
+        if uplink_feed(scenario, 1) and self.uplink2 != self.uplink1:
+            self.feeds = [
+                (self.uplink1, slice(0, None, 2)),
+                (self.uplink2, slice(1, None, 2))
+                ]
+        else:
+            self.feeds = [(self.uplink1, slice(None))]
+
+        # Access ports take the scenario packet size on their first second
+        self.limits = PortLimits(
+            [stats.speed for stats in access_stats],
+            [scenario.packet_size] * len(access_stats)
+            )
+        self.broadcast_limit = numpy.array(
+            [stats.broadcast_limit for stats in access_stats],
+            dtype=numpy.int64
+            )
+        self.multicast_limit = numpy.array(
+            [stats.multicast_limit for stats in access_stats],
+            dtype=numpy.int64
+            )
+        if scenario.int_unicast == -1:
+            self.max_unicast = numpy.where(
+                (scenario.unicast_max > 0) &
+                (scenario.unicast_max < self.limits.speed),
+                scenario.unicast_max * multiplier // scenario.packet_size,
+                self.limits.speed * multiplier // scenario.packet_size
+                )
+        else:
+            self.max_unicast = numpy.full(
+                len(access_stats),
+                scenario.int_unicast * multiplier // scenario.packet_size,
+                dtype=numpy.int64
+                )
+
+        # Looped ports as ('access'|'uplink', index) pairs
+        self.loops = []
+        for port in (scenario.loop1, scenario.loop2):
+            if port > 0 and port in self.uplink_of:
+                self.loops.append(('uplink', self.uplink_of[port]))
+            elif port > 0:
+                self.loops.append(('access', self.column_of[port]))
+
+        # Broadcast received per flooding domain, multicast per group
+        self.broadcast_index = FloodIndex(scenario.domains)
+        self.multicast_index = FloodIndex(scenario.multicast)
+        self.domain_broadcast = self.broadcast_index.zeros()
+        self.domain_multicast = self.multicast_index.zeros()
+        self.flood_broadcast = self.flood_multicast = None
+        self.storm = None
+        if scenario.loop_model == 'storm' and self.loops:
+            self.storm = LoopStorm(scenario.storm_gain)
+        self.profiles = seeds.profiles(scenario.profiles, self.access_ports)
+        self.streams = seeds.streams(
+            traffic_highs(eth_table, scenario, self.access_ports),
+            self.profiles
+            )
+        # Columns of the active access ports and uplinks in table order,
+        # the order the impairments are drawn in
+        table_ports = scenario.active
+        self.impairments = seeds.impairments(
+            scenario.impairments,
+            [self.port_stats(port) for port in table_ports]
+            )
+        table_columns = dict(
+            (port, column) for column, port in enumerate(table_ports)
+            )
+        self.access_columns = numpy.array(
+            [table_columns[port] for port in self.access_ports],
+            dtype=numpy.intp
+            )
+        self.uplink_columns = [table_columns[port] for port in uplinks]
+
+    def port_stats(self, port):
+        table = self.eth_table
+        return table.interfaces[table.interface_lookup[port]].interface_stats
+
+    def run(self):
+        runtime = self.scenario.runtime
+        block = max(1, draw_block_size // max(len(self.access_ports), 1))
+        for start in range(0, runtime, block):
+            seconds = min(block, runtime - start)
+            bcast, mcast, in_ucast, out_ucast = self.draw(seconds, start)
+            for i in range(seconds):
+                self.step(
+                    start + i, bcast[i], mcast[i], in_ucast[i], out_ucast[i]
+                    )
+                self.snapshot(start + i)
+            self.check_headroom()
+
+    def snapshot(self, second):
+        snapshots = self.snapshots
+        if snapshots is not None and snapshots.due(second + 1):
+            self.add_hellos(second + 1)
+            self.add_impairments(second + 1)
+            self.store()
+            snapshots.emit(second + 1)
+
+    def draw(self, seconds, second):
+        phase_clock.switch('generation')
+        s = self.scenario
+        shape = (seconds, len(self.access_ports))
+        bcast, mcast, in_ucast, out_ucast = self.streams.take(seconds, second)
+        if bcast is None:
+            bcast = numpy.full(shape, s.int_broadcast, dtype=numpy.int64)
+        if mcast is None:
+            mcast = numpy.full(shape, s.int_multicast, dtype=numpy.int64)
+        return bcast, mcast, in_ucast, out_ucast
+
+    def step(self, second, bcast, mcast, in_ucast, out_ucast):
+        phase_clock.switch('generation')
+        s = self.scenario
+        r = counter_rows
+        c = self.counters
+        ports = slice(None)
+
+        if not self.loops:
+            self.domain_broadcast[:] = 0
+            self.domain_multicast[:] = 0
+        # Reset Uplink per second stats
+        self.uplink_reset_per_sec(self.uplink1)
+        self.uplink_reset_per_sec(self.uplink2)
+
+        # Main Work Area
+        limits = self.limits
+        self.broadcast(r.in_broadcast_pkts, ports, bcast)
+        self.domain_broadcast += self.broadcast_index.totals(bcast)
+        self.count(r.in_multicast_pkts, ports, mcast)
+        self.domain_multicast += self.multicast_index.totals(mcast)
+        in_pps = limits.packets(mcast)
+        self.count(r.in_unicast_pkts, ports, in_ucast)
+        in_offered = in_pps + in_ucast
+        in_pps = limits.packets(in_offered)
+        if s.discards:
+            # Input over the line rate is dropped
+            self.add_errors(r.in_discards, ports, in_offered - in_pps)
+        self.count(r.out_unicast_pkts, ports, out_ucast)
+        out_pps = limits.packets(out_ucast)
+        bits = limits.packet_size * 8
+        c[r.in_bits_per_sec] = limits.bits(in_pps * bits)
+        c[r.out_bits_per_sec] = limits.bits(out_pps * bits)
+
+        # Inbound Broadcast and Multicast to the ports of each domain
+        phase_clock.switch('fan-out')
+        flood_broadcast = self.broadcast_index.flood(self.domain_broadcast)
+        flood_multicast = self.multicast_index.flood(self.domain_multicast)
+        self.flood_broadcast = flood_broadcast
+        self.flood_multicast = flood_multicast
+        self.broadcast(r.out_broadcast_pkts, ports, flood_broadcast)
+        self.count(r.out_multicast_pkts, ports, flood_multicast)
+        out_pps = limits.packets(out_pps + flood_broadcast)
+        out_pps = limits.packets(out_pps + flood_multicast)
+        c[r.in_pkts_per_sec] = in_pps
+        c[r.out_pkts_per_sec] = out_pps
+        for when, kind, port in s.rstp.due(second):
+            self.rstp_event(kind, port, in_ucast)
+
+        # Looped Ports Broadcast/Multicast
+        phase_clock.switch('loop-injection')
+        if second >= s.loop_after:
+            for kind, index in self.loops:
+                self.loop_port(kind, index)
+            if self.storm is not None:
+                self.loop_storm()
+
+        phase_clock.switch('aggregation')
+        self.aggregate()
+
+    def loop_port(self, kind, index):
+        """loop_interface_stats_manual() for one looped port."""
+        r = counter_rows
+        if kind == 'access':
+            # Its own domains' flood comes back
+            broadcast = int(self.flood_broadcast[index])
+            multicast = int(self.flood_multicast[index])
+            if self.storm is not None:
+                broadcast = 0
+            c = self.counters
+            self.broadcast(r.in_broadcast_pkts, index, broadcast)
+            self.count(r.in_multicast_pkts, index, multicast)
+            c[r.in_pkts_per_sec, index] = min(
+                c[r.in_pkts_per_sec, index] + broadcast + multicast,
+                self.limits.pkt_ceiling[index]
+                )
+            return
+        broadcast = int(self.domain_broadcast.sum())
+        multicast = int(self.domain_multicast.sum())
+        if self.storm is not None:
+            broadcast = 0
+        row = self.uplinks[index]
+        self.uplink_broadcast(index, r.in_broadcast_pkts, broadcast)
+        self.uplink_count(index, r.in_multicast_pkts, multicast)
+        row[r.in_pkts_per_sec] = min(
+            row[r.in_pkts_per_sec] + broadcast + multicast,
+            self.uplink_ceiling(index)
+            )
+        self.uplink_packet_size[index] = self.scenario.packet_size
+
+    def add_bpdus(self, port, in_bpdus, out_bpdus):
+        """add_bpdus() for one port."""
+        r = counter_rows
+        if port in self.uplink_of:
+            u = self.uplink_of[port]
+            self.uplink_add(u, r.in_multicast_pkts, in_bpdus)
+            self.uplink_add(u, r.out_multicast_pkts, out_bpdus)
+            return
+        self.add_port_bpdus(self.column_of[port], in_bpdus, out_bpdus)
+
+    def add_port_bpdus(self, ports, in_bpdus, out_bpdus):
+        r = counter_rows
+        self.add_counter(r.in_multicast_pkts, ports, in_bpdus)
+        self.add_counter(r.out_multicast_pkts, ports, out_bpdus)
+        self.folded[bpdu_folded[0], ports] += in_bpdus
+        self.folded[bpdu_folded[1], ports] += out_bpdus
+
+    def add_hellos(self, elapsed):
+        """add_hellos() for every port at once."""
+        rstp = self.scenario.rstp
+        hellos = rstp.hellos(elapsed)
+        if not hellos:
+            return
+        receive = numpy.array(
+            [port in rstp.receivers for port in self.access_ports],
+            dtype=numpy.int64
+            )
+        self.add_port_bpdus(
+            slice(None), hellos * receive, hellos * (1 - receive)
+            )
+        for port in self.uplink_ports:
+            if port in rstp.receivers:
+                self.add_bpdus(port, hellos, 0)
+            else:
+                self.add_bpdus(port, 0, hellos)
+
+    def add_errors(self, counter, ports, errors):
+        """add_errors() for access ports, kept off the uplinks."""
+        self.counters[counter, ports] += errors
+        self.folded[folded_index[counter_fields[counter]], ports] += errors
+
+    def add_impairments(self, elapsed):
+        """add_impairments() for every port at once."""
+        if self.impairments is None:
+            return
+        r = counter_rows
+        c = self.counters
+        ports = len(self.access_columns) + len(self.uplink_columns)
+        in_pkts = numpy.zeros(ports, dtype=object)
+        out_pkts = numpy.zeros(ports, dtype=object)
+        in_pkts[self.access_columns] = c[r.in_pkts].tolist()
+        out_pkts[self.access_columns] = c[r.out_pkts].tolist()
+        for u, column in enumerate(self.uplink_columns):
+            in_pkts[column] = self.uplinks[u][r.in_pkts]
+            out_pkts[column] = self.uplinks[u][r.out_pkts]
+        errors = self.impairments.draw(elapsed, in_pkts, out_pkts)
+        for name, values in errors:
+            counter = getattr(r, name)
+            self.add_errors(
+                counter, slice(None), values[self.access_columns]
+                )
+            for u, column in enumerate(self.uplink_columns):
+                self.uplinks[u][counter] += int(values[column])
+
+    def rstp_event(self, kind, port, in_ucast):
+        """rstp_event() for the array engines."""
+        r = counter_rows
+        c = self.counters
+        stats = self.port_stats(port)
+        if kind == 'settle':
+            stats.state = "Forward"
+            return
+        stats.state = "Blocked"
+        others = numpy.array(
+            [other != port for other in self.access_ports], dtype=numpy.int64
+            )
+        self.add_port_bpdus(slice(None), 0, rstp_tc_bpdus * others)
+        for other in self.uplink_ports:
+            if other != port:
+                self.add_bpdus(other, 0, rstp_tc_bpdus)
+        index = self.broadcast_index
+        flush = index.flood(index.zeros() + index.totals(in_ucast))
+        self.count(r.out_unicast_pkts, slice(None), flush)
+        c[r.out_pkts_per_sec] = self.limits.packets(
+            c[r.out_pkts_per_sec] + flush
+            )
+
+    def storm_ceiling(self):
+        """Most broadcast the slowest looped port carries a second."""
+        ceilings = []
+        for kind, index in self.loops:
+            if kind == 'access':
+                ceilings.append(storm_ceiling(
+                    int(self.limits.pkt_ceiling[index]),
+                    int(self.broadcast_limit[index])
+                    ))
+            else:
+                ceilings.append(storm_ceiling(
+                    self.uplink_ceiling(index),
+                    self.uplink_stats[index].broadcast_limit
+                    ))
+        return min(ceilings)
+
+    def storm_flood(self, rate):
+        """Storm broadcast each access port sends out a second."""
+        totals = self.broadcast_index.zeros()
+        looped = []
+        for kind, index in self.loops:
+            if kind == 'access':
+                totals[self.broadcast_index.ingress[index]] += rate
+                looped.append(index)
+            else:
+                totals += rate
+        flood = numpy.minimum(
+            self.broadcast_index.flood(totals), self.limits.pkt_ceiling
+            )
+        flood[looped] = rate
+        return flood
+
+    def loop_storm(self):
+        """loop_storm_stats() for one second of the storm."""
+        r = counter_rows
+        c = self.counters
+        inject = 0
+        for kind, index in self.loops:
+            if kind == 'access':
+                inject += int(self.flood_broadcast[index])
+            else:
+                inject += int(self.domain_broadcast.sum())
+        rate = self.storm.step(inject, self.storm_ceiling())
+        for kind, index in self.loops:
+            if kind == 'access':
+                self.add_counter(r.in_broadcast_pkts, index, rate)
+                c[r.in_pkts_per_sec, index] = min(
+                    c[r.in_pkts_per_sec, index] + rate,
+                    self.limits.pkt_ceiling[index]
+                    )
+                continue
+            row = self.uplinks[index]
+            self.uplink_add(index, r.in_broadcast_pkts, rate)
+            self.uplink_add(index, r.out_broadcast_pkts, rate)
+            for pps in (r.in_pkts_per_sec, r.out_pkts_per_sec):
+                row[pps] = min(row[pps] + rate, self.uplink_ceiling(index))
+        flood = self.storm_flood(rate)
+        self.add_counter(r.out_broadcast_pkts, slice(None), flood)
+        c[r.out_pkts_per_sec] = self.limits.packets(
+            c[r.out_pkts_per_sec] + flood
+            )
+
+    def add_counter(self, counter, ports, change):
+        """Add to a counter and its packets and octets, unclamped."""
+        pkts, octets = packet_rows[counter]
+        c = self.counters
+        c[counter, ports] += change
+        c[pkts, ports] += change
+        c[octets, ports] += change * 8
+
+    def aggregate(self):
+        """aggregate_interface_stats() from every access port to its uplink."""
+        growth = self.growth()
+        for u, ports in self.feeds:
+            first = ports.start or 0
+            if first >= len(self.access_ports):
+                continue
+            if self.uplink_packet_size[u] != self.limits.packet_size[first]:
+                # The uplink only picks up the access packet size after
+                # its first port has been added with its own
+                step = ports.step or 1
+                self.aggregate_ports(u, growth, slice(first, first + 1))
+                self.aggregate_ports(
+                    u, growth, slice(first + step, None, step)
+                    )
+            else:
+                self.aggregate_ports(u, growth, ports)
+
+    def growth(self):
+        """Growth of the aggregate_rows port counters since the last call."""
+        c = self.counters
+        if c.dtype == object and self.folded.dtype != object:
+            self.folded = self.folded.astype(object)
+        current = c[self.folded_rows]
+        growth = current - self.folded
+        self.folded = current
+        return growth
+
+    def aggregate_ports(self, u, growth, ports):
+        r = counter_rows
+        c = self.counters
+        row = self.uplinks[u]
+        growth = growth[:, ports]
+        if not growth.size:
+            return
+
+        # Multicast and unicast go through the packet clamp port by port,
+        # then every row is totalled in one reduction
+        limits = self.limits
+        pkt_ceiling = self.uplink_ceiling(u)
+        growth[2:6] = limits.clamp(
+            'limit_pkt_per_sec', growth[2:6], pkt_ceiling
+            )
+        totals = growth.sum(axis=1).tolist()
+        for index in (0, 1):
+            self.uplink_merge(
+                u, aggregate_rows[index][0], growth[index], totals[index]
+                )
+        for index in range(2, 6):
+            self.uplink_add(u, aggregate_rows[index][0], totals[index])
+        upper_limit = self.uplink_stats[u].default_int_limits[1]
+        for index in range(6, len(aggregate_rows)):
+            error = aggregate_rows[index][0]
+            row[error] = limits.running(
+                'limit_int_value', row[error], growth[index],
+                totals[index], upper_limit
+                )
+
+        bit_ceiling = self.uplink_stats[u].speed * multiplier
+        for uplink, port, ceiling, name in (
+                (r.out_bits_per_sec, r.in_bits_per_sec, bit_ceiling,
+                 'limit_bit_per_sec'),
+                (r.in_bits_per_sec, r.out_bits_per_sec, bit_ceiling,
+                 'limit_bit_per_sec'),
+                (r.out_pkts_per_sec, r.in_pkts_per_sec, pkt_ceiling,
+                 'limit_pkt_per_sec'),
+                (r.in_pkts_per_sec, r.out_pkts_per_sec, pkt_ceiling,
+                 'limit_pkt_per_sec')):
+            values = c[port, ports]
+            row[uplink] = limits.running(
+                name, row[uplink], values, self.total(values), ceiling
+                )
+        self.uplink_packet_size[u] = int(self.limits.packet_size[ports][-1])
+
+    def count(self, counter, ports, change):
+        """Multicast/unicast setter: clamp the change to line rate."""
+        pkts, octets = packet_rows[counter]
+        c = self.counters
+        change = self.limits.packets(change, ports)
+        c[counter, ports] += change
+        c[pkts, ports] += change
+        c[octets, ports] += change * 8
+
+    def broadcast(self, counter, ports, change):
+        """Broadcast setter: fall back to the limit on a large change."""
+        pkts, octets = packet_rows[counter]
+        c = self.counters
+        limit = self.broadcast_limit[ports]
+        change = numpy.where(
+            change >= c[counter, ports] + limit, limit, change
+            )
+        c[counter, ports] += change
+        c[pkts, ports] += change
+        c[octets, ports] += change * 8
+
+    def uplink_ceiling(self, u):
+        stats = self.uplink_stats[u]
+        return (stats.speed * multiplier) // (self.uplink_packet_size[u] * 8)
+
+    def uplink_reset_per_sec(self, u):
+        row = self.uplinks[u]
+        r = counter_rows
+        row[r.out_bits_per_sec] = 0
+        row[r.in_bits_per_sec] = 0
+        row[r.out_pkts_per_sec] = 0
+        row[r.in_pkts_per_sec] = 0
+
+    def uplink_add(self, u, counter, change):
+        pkts, octets = packet_rows[counter]
+        row = self.uplinks[u]
+        row[counter] += change
+        row[pkts] += change
+        row[octets] += change * 8
+
+    def uplink_count(self, u, counter, change):
+        change = int(self.limits.clamp(
+            'limit_pkt_per_sec', int(change), self.uplink_ceiling(u)
+            ))
+        self.uplink_add(u, counter, change)
+
+    def uplink_broadcast(self, u, counter, change):
+        change = int(change)
+        limit = self.uplink_stats[u].broadcast_limit
+        if change >= self.uplinks[u][counter] + limit:
+            change = limit
+        self.uplink_add(u, counter, change)
+
+    def uplink_merge(self, u, counter, values, total):
+        """Add each port's value to an uplink through the broadcast limit."""
+        limit = self.uplink_stats[u].broadcast_limit
+        if values.max() < self.uplinks[u][counter] + limit:
+            # The uplink total only grows, so no port can hit the limit
+            self.uplink_add(u, counter, total)
+            return
+        for value in values:
+            self.uplink_broadcast(u, counter, value)
+
+    def total(self, values):
+        """Sum port counters without wrapping int64."""
+        if self.wide and values.dtype != object:
+            high = values >> 32
+            low = values & 0xffffffff
+            return (int(high.sum()) << 32) + int(low.sum())
+        return int(values.sum())
+
+    def check_headroom(self):
+        c = self.counters
+        if not c.size or c.dtype == object:
+            return
+        r = counter_rows
+        peak = int(max(c[r.in_octets].max(), c[r.out_octets].max()))
+        if peak > max_array_counter:
+            self.counters = c.astype(object)
+        self.wide = peak * c.shape[1] > max_array_counter
+
+    def store(self):
+        """Write the current counters back into the interface stats."""
+        r = counter_rows
+        slots = ['_' + name for name in counter_fields]
+        columns = self.counters.T.tolist()
+        packet_size = self.limits.packet_size.tolist()
+        in_util, out_util = utilization_table(
+            self.limits.speed, self.limits.packet_size,
+            self.counters[r.in_pkts_per_sec].astype(float),
+            self.counters[r.out_pkts_per_sec].astype(float)
+            )
+        for column, port in enumerate(self.access_ports):
+            stats = self.port_stats(port)
+            for slot, value in zip(slots, columns[column]):
+                setattr(stats, slot, value)
+            stats._packet_size = packet_size[column]
+            stats.update_ceilings()
+            stats._in_utilization = in_util[column]
+            stats._out_utilization = out_util[column]
+        for u, stats in enumerate(self.uplink_stats):
+            for row, name in enumerate(counter_fields):
+                setattr(stats, '_' + name, self.uplinks[u][row])
+            stats._packet_size = self.uplink_packet_size[u]
+            stats.update_ceilings()
+            stats._in_utilization = stats._out_utilization = None
+
+
+def numpy_engine(eth_table, scenario, seeds, snapshots=None):
+    engine = NumpyEngine(eth_table, scenario, seeds, snapshots)
+    engine.run()
+    engine.add_hellos(scenario.runtime)
+    engine.add_impairments(scenario.runtime)
+    engine.store()
+
+
+class FastForwardEngine(NumpyEngine):
+    """NumpyEngine that skips over stretches of settled seconds.
+
+    While every setter clamp is known to either never bind or always bind
+    for a stretch of seconds, each cumulative counter over that stretch is
+    a sum of independent draws. The stretch is then replaced by sampling
+    those sums directly, exactly for short stretches and from a normal
+    approximation for long ones. Broadcast and multicast totals that carry
+    over from second to second need the draws weighted by how many seconds
+    they stay in, so each stream is sampled as its plain and accumulated
+    sums; each flooding domain and multicast group totals its own ports'
+    sums, which flood() spreads like any other second's totals. Unicast
+    that can pass the line rate is cut to it every second, so those ports
+    have the cut draws summed instead, from the moments of the cut
+    uniform draw, along with the input --discards drops. Seconds that
+    cannot be settled are stepped one at a time and the final second is
+    always simulated in detail.
+
+    The run is driven by a queue of scheduled events (shown seconds, the
+    loop start, RSTP changes, the edges of steps and bursts profiles on
+    cut ports) and only integrates between them, so a settled switch
+    costs about the same for a day as for a year.
+    """
+
+    def __init__(self, eth_table, scenario, seeds=None, snapshots=None):
+        NumpyEngine.__init__(self, eth_table, scenario, seeds, snapshots)
+        s = scenario
+        zeros = numpy.zeros(len(self.access_ports), dtype=numpy.int64)
+        if s.int_broadcast <= -1:
+            bcast = (zeros, self.broadcast_limit)
+        else:
+            bcast = (zeros + s.int_broadcast, zeros + s.int_broadcast)
+        if s.int_multicast == -1:
+            mcast = (zeros, self.multicast_limit)
+        else:
+            mcast = (zeros + s.int_multicast, zeros + s.int_multicast)
+        # (low, high) of each per second draw, in draw() order
+        self.bounds = (
+            bcast, mcast, (zeros, self.max_unicast), (zeros, self.max_unicast)
+            )
+
+        # Ports whose unicast the line rate can cut, or whose input it can
+        # discard. A steps or bursts profile on them ends stretches at its
+        # edges so their shares hold over each; under any other profile,
+        # or edges closer than edge_spacing, their moments are summed
+        # second by second, and drawn exactly where random multicast comes
+        # ahead of the discards as well
+        ceiling = self.limits.pkt_ceiling
+        self.cut = self.max_unicast > ceiling
+        if s.discards:
+            self.cut |= mcast[1] + self.max_unicast > ceiling
+        self.edges = []
+        self.moving = False
+        if numpy.any(self.cut) and self.profiles is not None:
+            edges = self.profiles.edges(self.cut, s.runtime)
+            if edges is not None and len(edges) * edge_spacing > s.runtime:
+                edges = None
+            self.moving = edges is None
+            self.edges = edges or []
+        self.exact_cut = self.moving and s.discards and numpy.any(
+            (mcast[0] != mcast[1])[self.cut]
+            )
+
+    def blocker(self):
+        """Reason the fast path can never be used, or None."""
+        if not self.access_ports:
+            return 'no access ports'
+        if len(set(self.loops)) != len(self.loops):
+            return 'both loop interfaces are the same port'
+        if numpy.any(self.bounds[1][1] > self.limits.pkt_ceiling):
+            return 'multicast can exceed the line rate'
+        return None
+
+    def run(self):
+        reason = self.blocker()
+        if reason:
+            print('Fast forward unavailable (' + reason + '), ' +
+                  'simulating every second')
+            NumpyEngine.run(self)
+            return
+
+        rstp = self.scenario.rstp
+        events = self.schedule()
+        self.wait = 0
+        self.backoff = 1
+        second = 0
+        while events:
+            # RSTP events schedule their own follow ups, so its heap is
+            # merged in as it goes
+            when, kind = events[0]
+            if rstp.next_event() is not None and rstp.next_event() < when:
+                when, kind = rstp.next_event(), 'rstp'
+            else:
+                heapq.heappop(events)
+            if when < second:
+                continue
+            self.advance(second, when)
+            second = when
+            if kind == 'boundary':
+                continue
+            # Shown seconds and RSTP events are simulated in full
+            self.step_one(second)
+            self.check_headroom()
+            if kind == 'show':
+                self.snapshot(second)
+            second += 1
+
+    def schedule(self):
+        """Heap of the (second, kind) events the run has to stop at.
+
+        'show' seconds have their counters written and are simulated in
+        full; a 'boundary' only ends a settled stretch, where the clamps
+        can change regime or a cut port's share changes. Scheduled RSTP
+        events come from the scenario.
+        """
+        s = self.scenario
+        if self.snapshots is not None:
+            shown = [elapsed - 1 for elapsed in self.snapshots.seconds()]
+        else:
+            shown = [s.runtime - 1]
+        events = [(second, 'show') for second in shown]
+        if self.loops and 0 < s.loop_after < s.runtime:
+            events.append((s.loop_after, 'boundary'))
+        events.extend((second, 'boundary') for second in self.edges)
+        heapq.heapify(events)
+        return events
+
+    def advance(self, second, until):
+        """Integrate the seconds from second up to until."""
+        while second < until:
+            regimes = None
+            if second > 0 and not self.wait and until - second > 1:
+                window, regimes = self.longest_window(second, until - second)
+                if regimes is None:
+                    self.wait = self.backoff
+                    self.backoff = min(self.backoff * 2, 1024)
+                else:
+                    self.backoff = 1
+            if regimes is not None:
+                self.jump(second, window, regimes)
+                second += window
+            else:
+                self.step_one(second)
+                second += 1
+                self.wait = max(self.wait - 1, 0)
+            self.check_headroom()
+
+    def step_one(self, second):
+        bcast, mcast, in_ucast, out_ucast = self.draw(1, second)
+        self.step(second, bcast[0], mcast[0], in_ucast[0], out_ucast[0])
+
+    def longest_window(self, second, remaining):
+        """Longest stretch from second with every clamp settled."""
+        if self.exact_cut:
+            remaining = min(
+                remaining, draw_block_size * 4 // len(self.access_ports)
+                )
+        regimes = self.regimes(second, remaining)
+        if regimes is not None:
+            return remaining, regimes
+        low, high = 1, remaining
+        regimes = self.regimes(second, low)
+        if regimes is None:
+            return 0, None
+        while high - low > 1:
+            middle = (low + high) // 2
+            found = self.regimes(second, middle)
+            if found is None:
+                high = middle
+            else:
+                low, regimes = middle, found
+        if low < 2:
+            return 0, None
+        return low, regimes
+
+    def regimes(self, second, window):
+        """Clamp regimes for a stretch of seconds, or None if unsettled.
+
+        Every bound only uses values that can grow, so checking the
+        largest possible input at the end of the stretch (or the smallest
+        at its start for clamps that always bind) covers every second.
+        """
+        s = self.scenario
+        r = counter_rows
+        c = self.counters
+        accumulate = bool(self.loops)
+        if accumulate and second < s.loop_after < second + window:
+            return None
+        looping = accumulate and second >= s.loop_after
+        (bcast_low, bcast_high), (mcast_low, mcast_high) = self.bounds[:2]
+
+        # Each port is flooded with its domains' (groups') totals
+        broadcast, multicast = self.broadcast_index, self.multicast_index
+        if accumulate:
+            tb_high = broadcast.flood(
+                self.domain_broadcast + window * broadcast.totals(bcast_high)
+                )
+            tm_low = multicast.flood(
+                self.domain_multicast + multicast.totals(mcast_low)
+                )
+            tm_high = multicast.flood(
+                self.domain_multicast + window * multicast.totals(mcast_high)
+                )
+        else:
+            tb_high = broadcast.flood(
+                broadcast.zeros() + broadcast.totals(bcast_high)
+                )
+            tm_low = multicast.flood(
+                multicast.zeros() + multicast.totals(mcast_low)
+                )
+            tm_high = multicast.flood(
+                multicast.zeros() + multicast.totals(mcast_high)
+                )
+
+        # Multicast fan-out clamps at line rate
+        ceiling = self.limits.pkt_ceiling
+        tm_always = tm_low >= ceiling
+        if not numpy.all(tm_always | (tm_high <= ceiling)):
+            return None
+        # Broadcast limit never binds on changes up to it or once the
+        # counter is a limit ahead, and binds every second while the
+        # change outgrows the counter by more than the limit
+        limit = self.broadcast_limit
+        in_always = limit_regime(
+            c[r.in_broadcast_pkts], limit, window, bcast_high, bcast_low, 0
+            )
+        if in_always is None:
+            return None
+        low_flood = broadcast.flood(
+            broadcast.zeros() + broadcast.totals(bcast_low)
+            )
+        if accumulate:
+            tb_base = broadcast.flood(self.domain_broadcast)
+            tb_rate = low_flood
+        else:
+            tb_base, tb_rate = low_flood, low_flood * 0
+        tb_always = limit_regime(
+            c[r.out_broadcast_pkts], limit, window, tb_high, tb_base, tb_rate
+            )
+        if tb_always is None:
+            return None
+        storm = None
+        loop_ports = []
+        uplink_loops = []
+        loop_always = numpy.zeros(len(self.access_ports), dtype=bool)
+        if looping:
+            loop_ports = [
+                index for kind, index in self.loops if kind == 'access'
+                ]
+            uplink_loops = [
+                index for kind, index in self.loops if kind == 'uplink'
+                ]
+            # The loop adds to a looped port's own broadcast counter
+            if numpy.any(in_always[loop_ports]):
+                return None
+        if looping and self.storm is not None:
+            # Only a saturated storm adds the same every second
+            rate = self.storm.rate
+            if rate < self.storm_ceiling():
+                return None
+            storm = self.storm_flood(rate)
+            tb_always = limit_regime(
+                c[r.out_broadcast_pkts], limit, window, tb_high, tb_base,
+                tb_rate, storm
+                )
+            if tb_always is None:
+                return None
+        elif loop_ports:
+            found = limit_regime(
+                c[r.in_broadcast_pkts, loop_ports], limit[loop_ports],
+                window, tb_high[loop_ports], tb_base[loop_ports],
+                tb_rate[loop_ports], bcast_high[loop_ports]
+                )
+            if found is None:
+                return None
+            loop_always[loop_ports] = found
+
+        # A looped uplink takes every domain's totals through its own
+        # clamps: the broadcast limit has to stay clear of them, its
+        # multicast clamp can also bind every second
+        uplink_always = {}
+        for u in uplink_loops:
+            row = self.uplinks[u]
+            if storm is None:
+                up_limit = self.uplink_stats[u].broadcast_limit
+                peak = int(self.domain_broadcast.sum()) + window * int(
+                    bcast_high.sum()
+                    )
+                if (peak > up_limit and
+                        peak >= row[r.in_broadcast_pkts] + up_limit):
+                    return None
+            up_ceiling = self.uplink_ceiling(u)
+            total = int(self.domain_multicast.sum())
+            uplink_always[u] = total + int(mcast_low.sum()) >= up_ceiling
+            peak = total + window * int(mcast_high.sum())
+            if not uplink_always[u] and peak > up_ceiling:
+                return None
+
+        # Largest per second growth of each port counter the uplink reads
+        fanout = numpy.minimum(tm_high, ceiling)
+        looped = numpy.zeros(len(self.access_ports), dtype=numpy.int64)
+        looped[loop_ports] = 1
+        if storm is None:
+            loop_broadcast = numpy.where(loop_always, limit, tb_high)
+            storm_out = 0
+        else:
+            loop_broadcast = rate
+            storm_out = storm
+        unicast = numpy.minimum(self.max_unicast, ceiling)
+        growth = {
+            r.in_broadcast_pkts: numpy.where(
+                in_always, limit, bcast_high) + looped * loop_broadcast,
+            r.out_broadcast_pkts: numpy.where(
+                tb_always, limit, tb_high) + storm_out,
+            r.in_multicast_pkts: mcast_high + looped * fanout,
+            r.out_multicast_pkts: fanout,
+            r.in_unicast_pkts: unicast,
+            r.out_unicast_pkts: unicast,
+            }
+        # and the smallest, for the uplink clamps that always bind
+        fanout = numpy.minimum(tm_low, ceiling)
+        least = {
+            r.in_multicast_pkts: mcast_low + looped * fanout,
+            r.out_multicast_pkts: fanout,
+            r.in_unicast_pkts: 0 * unicast,
+            r.out_unicast_pkts: 0 * unicast,
+            }
+
+        # Uplinks take that growth port by port through their own clamps
+        capped = []
+        for u, feed in self.feeds:
+            if not len(self.access_ports[feed]):
+                continue
+            up_ceiling = self.uplink_ceiling(u)
+            for field in (r.in_multicast_pkts, r.out_multicast_pkts,
+                          r.in_unicast_pkts, r.out_unicast_pkts):
+                always = least[field][feed] >= up_ceiling
+                if numpy.any(~always & (growth[field][feed] > up_ceiling)):
+                    return None
+                if numpy.any(always):
+                    index = folded_index[counter_fields[field]]
+                    capped.append((u, index, always))
+            up_limit = self.uplink_stats[u].broadcast_limit
+            for field in (r.in_broadcast_pkts, r.out_broadcast_pkts):
+                peak = int(growth[field][feed].max())
+                if (peak > up_limit and
+                        peak >= self.uplinks[u][field] + up_limit):
+                    return None
+
+        return {
+            'accumulate': accumulate,
+            'loop_ports': loop_ports,
+            'uplink_always': uplink_always,
+            'in_always': in_always,
+            'tm_always': tm_always,
+            'tb_always': tb_always,
+            'loop_always': loop_always,
+            'storm': storm,
+            'capped': capped,
+            }
+
+    def sample_sums(self, second, window):
+        """Plain and accumulated sums of each draw stream, and discards.
+
+        Per port and stream this is sum(x) and sum(i * x) with i counting
+        down from window to 1, returned as (int64, float) arrays. Unicast
+        is summed as the count setter keeps it, cut to the line rate, and
+        only has its plain sum sampled, the jump never uses the
+        accumulated one. The last entry is the input --discards drops, or
+        None without it.
+        """
+        ports = len(self.access_ports)
+        ceiling = self.limits.pkt_ceiling
+        once = numpy.arange(window, 0, -1, dtype=float)
+        if window * ports <= draw_block_size * 4:
+            bcast, mcast, in_ucast, out_ucast = self.draw(window, second)
+            discards = None
+            if self.scenario.discards:
+                offered = numpy.minimum(mcast, ceiling) + in_ucast
+                discards = numpy.maximum(offered - ceiling, 0).sum(axis=0)
+            sums = []
+            for draws in (bcast, mcast, numpy.minimum(in_ucast, ceiling),
+                          numpy.minimum(out_ucast, ceiling)):
+                sums.append((draws.sum(axis=0), numpy.dot(once, draws)))
+            return sums + [discards]
+
+        weights, gram = window_moments(window)
+        scale = numpy.sqrt(numpy.diag(gram))
+        chol = numpy.linalg.cholesky(gram / numpy.outer(scale, scale))
+        sums = []
+        shares = None
+        if self.profiles is not None:
+            shares = self.profiles.window_sums(second, window)
+        cut = self.cut
+        if numpy.any(cut):
+            kept, lost = self.cut_moments(second, window)
+            top = numpy.minimum(self.max_unicast, ceiling)[cut]
+        for stream, (low, high) in enumerate(self.bounds):
+            mean = (low + high) / 2.0
+            spread = numpy.sqrt(((high - low + 1) ** 2 - 1) / 12.0)
+            if stream < 2:
+                normal = numpy.dot(
+                    self.rng.standard_normal((ports, 2)), chol.T
+                    )
+                sample = []
+                for k in range(2):
+                    value = numpy.rint(
+                        mean * weights[k] + spread * scale[k] * normal[:, k]
+                        )
+                    sample.append(numpy.clip(
+                        value, low * float(weights[k]),
+                        high * float(weights[k])
+                        ))
+                sums.append((sample[0].astype(numpy.int64), sample[1]))
+                continue
+            # Each unicast second is the draw times that second's share
+            if shares is None:
+                total = squares = float(window)
+                normal = numpy.dot(
+                    self.rng.standard_normal((ports, 2)), chol.T
+                    )[:, 0]
+            else:
+                total, squares = shares
+                normal = self.rng.standard_normal(ports)
+            value = numpy.rint(
+                mean * total + spread * numpy.sqrt(squares) * normal
+                )
+            value = numpy.clip(value, low * total, high * total)
+            if numpy.any(cut):
+                value[cut] = numpy.clip(numpy.rint(
+                    kept[0] + numpy.sqrt(kept[1]) * normal[cut]
+                    ), 0, window * top)
+            sums.append((value.astype(numpy.int64), None))
+
+        discards = None
+        if self.scenario.discards:
+            discards = numpy.zeros(ports, dtype=numpy.int64)
+            if numpy.any(cut):
+                room = ceiling - numpy.minimum(self.bounds[1][1], ceiling)
+                value = numpy.rint(
+                    lost[0] + numpy.sqrt(lost[1]) *
+                    self.rng.standard_normal(len(top))
+                    )
+                discards[cut] = numpy.clip(
+                    value, 0, window * numpy.maximum(
+                        self.max_unicast[cut] - room[cut], 0
+                        )
+                    )
+        return sums + [discards]
+
+    def cut_moments(self, second, window):
+        """Summed moments of the cut ports' kept unicast and discards.
+
+        Returns the (mean, variance) over a stretch of the unicast the line
+        rate leaves each cut port and of the input --discards drops from
+        it, the multicast draw averaged out. Every second is the uniform
+        unicast draw scaled by that second's share: shares that hold over
+        the stretch are worked out once, moving ones second by second for
+        each group of ports on the same profile, draw and ceiling.
+        """
+        cut = self.cut
+        high = self.max_unicast[cut]
+        ceiling = self.limits.pkt_ceiling[cut]
+        low_m, high_m = [bound[cut] for bound in self.bounds[1]]
+        if not self.moving:
+            top = high.astype(float)
+            if self.profiles is not None:
+                top = top * self.profiles.scale(second, 1)[0][cut]
+            multicast = low_m[:, None] + numpy.arange(
+                int((high_m - low_m).max()) + 1
+                )
+            drawn = multicast <= high_m[:, None]
+            room = ceiling[:, None] - numpy.minimum(
+                multicast, ceiling[:, None]
+                )
+            mean, variance = excess_moments(top[:, None], room)
+            weight = drawn / drawn.sum(axis=1, keepdims=True)
+            lost_mean = (mean * weight).sum(axis=1)
+            lost_square = ((variance + mean * mean) * weight).sum(axis=1)
+            lost = (lost_mean, numpy.maximum(
+                lost_square - lost_mean * lost_mean, 0.0
+                ))
+            return [
+                (window * mean, window * variance)
+                for mean, variance in (clamped_moments(top, ceiling), lost)
+                ]
+
+        # Multicast is fixed here, exact_cut draws the other case
+        room = ceiling - numpy.minimum(low_m, ceiling)
+        keys = numpy.stack(
+            [self.profiles.index[cut], high, ceiling, room], axis=1
+            )
+        groups, inverse = numpy.unique(keys, axis=0, return_inverse=True)
+        sums = numpy.zeros((4, len(groups)))
+        for first in range(second, second + window, profile_window):
+            curves = self.profiles.curves(
+                first, min(profile_window, second + window - first)
+                )
+            for g, (n, high_g, ceiling_g, room_g) in enumerate(groups):
+                top = curves[:, n] * high_g
+                moments = clamped_moments(top, ceiling_g) + excess_moments(
+                    top, room_g
+                    )
+                for k, values in enumerate(moments):
+                    sums[k, g] += values.sum()
+        sums = sums[:, inverse.reshape(-1)]
+        return [(sums[0], sums[1]), (sums[2], sums[3])]
+
+    def jump(self, second, window, regimes):
+        """Advance window seconds by sampling the summed traffic."""
+        phase_clock.switch('generation')
+        r = counter_rows
+        c = self.counters
+        sampled = self.sample_sums(second, window)
+        bcast, mcast, in_ucast, out_ucast, discards = sampled
+        loop_ports = regimes['loop_ports']
+        ceiling = self.limits.pkt_ceiling
+        limit = self.broadcast_limit
+
+        # Sum of each domain's (group's) per second totals over the
+        # stretch, flooded to its ports
+        broadcast, multicast = self.broadcast_index, self.multicast_index
+        if regimes['accumulate']:
+            tb_sums = window_totals(
+                broadcast, bcast[1], window, self.domain_broadcast
+                )
+            tm_sums = window_totals(
+                multicast, mcast[1], window, self.domain_multicast
+                )
+            self.domain_broadcast += broadcast.totals(bcast[0])
+            self.domain_multicast += multicast.totals(mcast[0])
+        else:
+            tb_sums = window_totals(broadcast, bcast[0], window)
+            tm_sums = window_totals(multicast, mcast[0], window)
+        tb_flood = broadcast.flood(tb_sums)
+        tm_flood = multicast.flood(tm_sums)
+
+        # Widen before any port can pass the int64 headroom
+        peak = int(max(c[r.in_octets].max(), c[r.out_octets].max()))
+        growth = int(tb_flood.max()) + window * int(
+            3 * ceiling.max() + self.bounds[0][1].max() +
+            self.bounds[1][1].max() + self.max_unicast.max()
+            )
+        if c.dtype != object and peak + 8 * growth > max_array_counter:
+            self.counters = c = c.astype(object)
+
+        tb_always = regimes['tb_always']
+        tm_always = regimes['tm_always']
+        loop_always = regimes['loop_always']
+        fanout = self.pick(tm_always, window * ceiling, tm_flood)
+        flood = self.pick(tb_always, window * limit, tb_flood)
+
+        # Access ports
+        ports = slice(None)
+        self.add_counter(
+            r.in_broadcast_pkts, ports,
+            self.pick(regimes['in_always'], window * limit, bcast[0])
+            )
+        self.add_counter(r.in_multicast_pkts, ports, mcast[0])
+        self.add_counter(r.in_unicast_pkts, ports, in_ucast[0])
+        self.add_counter(r.out_unicast_pkts, ports, out_ucast[0])
+        self.add_counter(r.out_broadcast_pkts, ports, flood)
+        self.add_counter(r.out_multicast_pkts, ports, fanout)
+        if discards is not None:
+            self.add_errors(r.in_discards, ports, discards)
+        storm = regimes['storm']
+        if storm is not None:
+            self.add_counter(r.out_broadcast_pkts, ports, window * storm)
+        for index in loop_ports:
+            if storm is not None:
+                self.add_counter(
+                    r.in_broadcast_pkts, index, window * self.storm.rate
+                    )
+            elif loop_always[index]:
+                self.add_counter(
+                    r.in_broadcast_pkts, index, window * int(limit[index])
+                    )
+            else:
+                self.add_counter(r.in_broadcast_pkts, index, tb_flood[index])
+            self.add_counter(r.in_multicast_pkts, index, fanout[index])
+        for u, always in regimes['uplink_always'].items():
+            if storm is not None:
+                self.uplink_add(
+                    u, r.in_broadcast_pkts, window * self.storm.rate
+                    )
+                self.uplink_add(
+                    u, r.out_broadcast_pkts, window * self.storm.rate
+                    )
+            else:
+                self.uplink_add(u, r.in_broadcast_pkts, int(tb_sums.sum()))
+            if always:
+                self.uplink_add(
+                    u, r.in_multicast_pkts, window * self.uplink_ceiling(u)
+                    )
+            else:
+                self.uplink_add(u, r.in_multicast_pkts, int(tm_sums.sum()))
+
+        # Uplinks take the ports' growth unclamped, regimes() checked no
+        # clamp binds but on the ports that pass the line rate every second
+        growth = self.growth()
+        for u, ports in self.feeds:
+            row = self.uplinks[u]
+            growth_u = growth[:, ports]
+            for capped_u, index, always in regimes['capped']:
+                if capped_u == u:
+                    growth_u[index, always] = window * self.uplink_ceiling(u)
+            totals = growth_u.sum(axis=1).tolist()
+            upper_limit = self.uplink_stats[u].default_int_limits[1]
+            for index, (up_field, field) in enumerate(aggregate_rows):
+                if up_field in error_rows:
+                    row[up_field] = min(row[up_field] + totals[index],
+                                        upper_limit)
+                else:
+                    self.uplink_add(u, up_field, totals[index])
+
+    def pick(self, mask, chosen, shared):
+        """Per port values: chosen where mask is set, else shared."""
+        values = numpy.empty(len(mask), dtype=self.counters.dtype)
+        if not numpy.all(mask):
+            values[:] = shared
+        values[mask] = chosen[mask]
+        return values
+
+
+def limit_regime(start, limit, window, high, base, rate, extra=0):
+    """Ports where the broadcast limit binds every second of a stretch.
+
+    Changes are at most high and at least base + rate per elapsed second;
+    start is the counter at the start of the stretch, which also grows by
+    up to extra a second outside the limit. Returns None if some port can
+    go either way.
+    """
+    never = (high <= limit) | (high < start + limit)
+    always = ((base + rate >= start + limit + extra) &
+              (base + window * rate >= start + window * (limit + extra)))
+    if not numpy.all(never | always):
+        return None
+    return always & ~never
+
+
+def window_moments(window):
+    """Weight sums and Gram matrix of the fast forward draw weights.
+
+    The weights for draw i (window down to 1) are 1 and i, summed with
+    Faulhaber's formulas so long windows stay cheap.
+    """
+    n = window
+    s1 = n * (n + 1) // 2
+    s2 = n * (n + 1) * (2 * n + 1) // 6
+    weights = (n, s1)
+    gram = numpy.array([[n, s1], [s1, s2]], dtype=float)
+    return weights, gram
+
+
+def window_totals(index, sums, window, carried=None):
+    """Per domain totals of the ports' sums over a stretch, as Python ints.
+
+    carried is what each domain already holds, counted again every second
+    of the stretch.
+    """
+    totals = numpy.zeros(index.count, dtype=object)
+    numpy.add.at(totals, index.ingress, numpy.array(
+        [int(value) for value in numpy.rint(sums)], dtype=object
+        ))
+    if carried is not None:
+        totals += window * carried.astype(object)
+    return totals
+
+
+def clamped_moments(high, ceiling):
+    """Mean and variance of min(x, ceiling) for x uniform on 0..high."""
+    top = numpy.minimum(ceiling, high).astype(float)
+    n = high + 1.0
+    mean = (top * (top + 1) / 2 + (high - top) * top) / n
+    square = (top * (top + 1) * (2 * top + 1) / 6 +
+              (high - top) * top * top) / n
+    return mean, numpy.maximum(square - mean * mean, 0.0)
+
+
+def excess_moments(high, threshold):
+    """Mean and variance of max(0, x - threshold), x uniform on 0..high."""
+    over = numpy.maximum(high - threshold, 0.0)
+    n = high + 1.0
+    mean = over * (over + 1) / (2 * n)
+    square = over * (over + 1) * (2 * over + 1) / (6 * n)
+    return mean, numpy.maximum(square - mean * mean, 0.0)
+
+
+def fast_forward_engine(eth_table, scenario, seeds, snapshots=None):
+    engine = FastForwardEngine(eth_table, scenario, seeds, snapshots)
+    engine.run()
+    engine.add_hellos(scenario.runtime)
+    engine.add_impairments(scenario.runtime)
+    engine.store()
+
+
+engines = {
+    'python': python_engine,
+    'numpy': numpy_engine,
+    'fast-forward': fast_forward_engine,
+    }
+
+
+# Layout of one port's block in the ICX "show interface" output
+interface_layout = (
+    "Port    Link    State   Dupl Speed Trunk Tag Pvid Pri    MAC"
+    "             Name    \n"
+    "{port:<6} {link:>5} {state:>7} {duplex:>7} {speed:>4} {trunk:>5}"
+    " {tag:>5}"
+    " {vlan:>4} {prio} {mac} \n\n"
+    " Port {port} Counters:                                        "
+    "                \n"
+    "         InOctets {in_octets:>20}           "
+    "OutOctets {out_octets:>20}\n"
+    "           InPkts {in_pkts:>20}             "
+    "OutPkts {out_pkts:>20}\n"
+    "  InBroadcastPkts {in_broadcast_pkts:>20}"
+    "    OutBroadcastPkts {out_broadcast_pkts:>20}\n"
+    "  InMulticastPkts {in_multicast_pkts:>20}"
+    "    OutMulticastPkts {out_multicast_pkts:>20}\n"
+    "    InUnicastPkts {in_unicast_pkts:>20}"
+    "      OutUnicastPkts {out_unicast_pkts:>20}\n"
+    "        InBadPkts {in_bad_fragments:>20}                             "
+    "        \n"
+    "      InFragments {in_good_fragments:>20}                            "
+    "        \n"
+    "       InDiscards {in_discards:>20}                                  "
+    "        \n"
+    "              CRC {crc_errors:>20}          "
+    "Collisions {collisions:>20}\n"
+    "         InErrors {in_errors:>20}      "
+    "LateCollisions {late_collisions:>20}  \n"
+    "      InGiantPkts {giant_pkts:>20}                                   "
+    "        \n"
+    "      InShortPkts {short_pkts:>20}                                   "
+    "        \n"
+    "         InJabber {jabber:>20}                                       "
+    "        \n"
+    "   InFlowCtrlPkts                    0"
+    "     OutFlowCtrlPkts                    0\n"
+    "     InBitsPerSec {in_bits_per_sec:>20}"
+    "       OutBitsPerSec {out_bits_per_sec:>20}\n"
+    "     InPktsPerSec {in_pkts_per_sec:>20}"
+    "       OutPktsPerSec {out_pkts_per_sec:>20}\n"
+    "    InUtilization {in_utilization:>20.2f}%"
+    "     OutUtilization {out_utilization:>20.2f}%\n"
+)
+
+
+def interface_fields(interface):
     stats = interface.interface_stats
-    output = (
-        "Port    Link    State   Dupl Speed Trunk Tag Pvid Pri    MAC"
-        "             Name    \n"
-        "{int:<6} {link:>5} {state:>7} {duplex:>7} {speed:>4} {trunk:>5}"
-        " {tag:>5}"
-        " {vlan:>4} {prio} {mac} \n\n"
-        " Port {int} Counters:                                                "
-        "        \n"
-        "         InOctets {in_octets:>20}           "
-        "OutOctets {out_octets:>20}\n"
-        "           InPkts {in_pkts:>20}             "
-        "OutPkts {out_pkts:>20}\n"
-        "  InBroadcastPkts {in_broadcast_pkts:>20}"
-        "    OutBroadcastPkts {out_broadcast_pkts:>20}\n"
-        "  InMulticastPkts {in_multicast_pkts:>20}"
-        "    OutMulticastPkts {out_multicast_pkts:>20}\n"
-        "    InUnicastPkts {in_unicast_pkts:>20}"
-        "      OutUnicastPkts {out_unicast_pkts:>20}\n"
-        "        InBadPkts {in_bad_fragments:>20}                             "
-        "        \n"
-        "      InFragments {in_good_fragments:>20}                            "
-        "        \n"
-        "       InDiscards {in_discards:>20}                                  "
-        "        \n"
-        "              CRC {crc_errors:>20}          "
-        "Collisions {collisions:>20}\n"
-        "         InErrors {in_errors:>20}      "
-        "LateCollisions {late_collisions:>20}  \n"
-        "      InGiantPkts {giant_pkts:>20}                                   "
-        "        \n"
-        "      InShortPkts {short_pkts:>20}                                   "
-        "        \n"
-        "         InJabber {jabber:>20}                                       "
-        "        \n"
-        "   InFlowCtrlPkts                    0"
-        "     OutFlowCtrlPkts                    0\n"
-        "     InBitsPerSec {in_bits_per_sec:>20}"
-        "       OutBitsPerSec {out_bits_per_sec:>20}\n"
-        "     InPktsPerSec {in_pkts_per_sec:>20}"
-        "       OutPktsPerSec {out_pkts_per_sec:>20}\n"
-        "    InUtilization {in_utilization:>20.2f}%"
-        "     OutUtilization {out_utilization:>20.2f}%\n"
-    ).format(
-        int=interface.name,
+    return dict(
+        port=interface.name,
         link=stats.link,
         state=stats.state,
         duplex=stats.duplex,
@@ -1170,27 +4541,419 @@ def interface_print(interface):
         out_utilization=stats.out_utilization,
         vlan=stats.vlan, space20=" "
     )
-    return output
+
+
+def interface_row(interface):
+    """A port's values in row_fields order, read straight from the slots.
+
+    The utilization comes from the cached values, see fill_utilization().
+    """
+    stats = interface.interface_stats
+    return (interface.name, interface.mac) + stats_row(stats) + (
+        stats.in_utilization, stats.out_utilization
+        )
+
+
+def fill_utilization(interfaces):
+    """Work out every stale utilization at once before the ports are read.
+
+    Same arithmetic as calc_utilization(), one array pass with NumPy.
+    Only ports whose speed, packet size or per second packets changed
+    since their utilization was last read are stale.
+    """
+    stale = [
+        stats for stats in map(interface_stats, interfaces)
+        if stats._in_utilization is None or stats._out_utilization is None
+        ]
+    if not stale:
+        return
+    if numpy is None:
+        for stats in stale:
+            stats.in_utilization, stats.out_utilization
+        return
+    speed, packet_size, in_pps, out_pps = numpy.array(
+        list(map(utilization_inputs, stale)), dtype=float
+        ).T
+    in_util, out_util = utilization_table(speed, packet_size, in_pps, out_pps)
+    for stats, in_value, out_value in zip(stale, in_util, out_util):
+        stats._in_utilization = in_value
+        stats._out_utilization = out_value
+
+
+def utilization_table(speed, packet_size, in_pps, out_pps):
+    """calc_utilization() over arrays, as lists of in and out values."""
+    line_rate = (speed * multiplier) / (packet_size * 8.0)
+    return [
+        numpy.minimum((pps * 100.0) / line_rate, 100.00).tolist()
+        for pps in (in_pps, out_pps)
+        ]
+
+
+def interface_print(interface):
+    return interface_layout.format(**interface_fields(interface))
+
+
+class InterfaceRenderer(object):
+    """interface_layout compiled once into printf style templates.
+
+    Every field of the layout becomes a fixed width %-conversion over a
+    row of plain values in row_fields order (see interface_row()), so a
+    port renders with one % instead of a keyword format call. lines
+    holds the same compilation per layout line
+    (lines without fields joined to the next) with a getter for the
+    values each one shows. The output matches interface_print() byte for
+    byte.
+    """
+
+    # Format specs the layout uses, as fill-free align, width, precision
+    spec_pattern = re.compile(r'^([<>]?)(\d*)(\.\d+f)?$')
+
+    def __init__(self, layout=interface_layout):
+        self.template, self.order = self.compile(layout)
+        self.lines = []
+        static = ''
+        for line in layout.splitlines(True):
+            template, order = self.compile(line)
+            if order is None:
+                static += template
+                continue
+            self.lines.append((static + template, order))
+            static = ''
+        if static:
+            self.lines[-1] = (self.lines[-1][0] + static, self.lines[-1][1])
+
+    def compile(self, layout):
+        """Template and row getter for a piece of the layout."""
+        template = ''
+        shown = []
+        for literal, name, spec, conversion in string.Formatter().parse(
+                layout):
+            template += literal.replace('%', '%%')
+            if name is None:
+                continue
+            match = self.spec_pattern.match(spec)
+            if conversion or not match:
+                raise ValueError('Unsupported layout field: ' + name)
+            align, width, precision = match.groups()
+            template += '%'
+            if align == '<':
+                template += '-'
+            template += width + (precision or 's')
+            shown.append(row_fields.index(name))
+        if not shown:
+            return template, None
+        return template, operator.itemgetter(*shown)
+
+    def row(self, interface):
+        return interface_row(interface)
+
+    def render(self, row):
+        return self.template % self.order(row)
+
+    def render_rows(self, rows):
+        template = self.template
+        order = self.order
+        return ''.join([template % order(row) for row in rows])
 
 
 def search(text, pattern):
     if DEBUG_SEARCH:
-        print 'search()::text->: ' + text.strip("\n")
+        print('search()::text->: ' + text.strip("\n"))
     matches = pattern.search(text)
     # Confirm a match
     if matches:
         if DEBUG_SEARCH:
-            print 'Match!'
+            print('Match!')
         # Check for count matches if requested
         return matches, len(matches.groups())
     # No Match!
     else:
         if DEBUG_SEARCH:
-            print 'No Match!'
+            print('No Match!')
         matches = None
         return None, -1
 
 
+######
+# Parsing
+###
+class InterfaceParser(object):
+    """interface_layout output read back a port or a field at a time.
+
+    Every value the layout shows is a single token without whitespace,
+    so splitting a port's block on whitespace puts each value at the
+    same token position however wide it was printed. The positions are
+    worked out once from the layout, like InterfaceRenderer compiles it.
+    A chunk is split once, and each run of blocks between snapshot lines
+    is converted a column at a time, every port's value of a field taken
+    with one stride slice and converted with one map(). stream() zips
+    the columns into a dict per port, columns() keeps them as they are.
+    Records are dicts of the fields the layout shows, with the counters
+    as ints, the utilization as floats and the snapshot second (None
+    outside snapshots) under 'second'. Delta snapshots are not read.
+    """
+
+    def __init__(self, layout=interface_layout):
+        skeleton = ''
+        names = []
+        for literal, name, spec, conversion in string.Formatter().parse(
+                layout):
+            skeleton += literal
+            if name is not None:
+                skeleton += '\0{0}\0'.format(len(names))
+                names.append(name)
+        tokens = skeleton.split()
+        self.size = len(tokens)
+        self.start = tokens[0].encode()
+        # Blocks begin with the layout's first line
+        self.marker = ('\n' + layout.split('\n', 1)[0]).encode()
+        self.names = []
+        self.fields = []
+        for position, token in enumerate(tokens):
+            pieces = token.split('\0')
+            if len(pieces) == 1:
+                continue
+            if len(pieces) != 3:
+                raise ValueError('Unsupported layout token: ' + token)
+            prefix, index, suffix = pieces
+            name = names[int(index)]
+            if name in self.names:
+                continue
+            self.names.append(name)
+            self.fields.append((
+                name, position, len(prefix), len(suffix), self.kind(name)
+                ))
+        self.converters = [
+            self.converter(name, prefix, suffix, kind)
+            for name, position, prefix, suffix, kind in self.fields
+            ]
+
+    def kind(self, name):
+        if name in counter_fields:
+            return int
+        if name in ('in_utilization', 'out_utilization'):
+            return float
+        return None
+
+    def converter(self, name, prefix, suffix, kind):
+        # A function from a field's tokens to its values
+        if kind is None and name in ('speed', 'vlan'):
+            # Unless they show None or N/A
+            def kind(token):
+                if token.isdigit():
+                    return int(token)
+                return token.decode()
+        elif kind is None:
+            kind = bytes.decode
+        if not prefix and not suffix:
+            return lambda tokens: map(kind, tokens)
+        end = -suffix or None
+        return lambda tokens: [kind(token[prefix:end]) for token in tokens]
+
+    def run_columns(self, tokens):
+        # Values of a run of whole blocks, a column per field
+        size = self.size
+        starts = tokens[::size]
+        if len(tokens) % size or starts.count(self.start) != len(starts):
+            for index, start in enumerate(starts):
+                if start != self.start or len(tokens) < (index + 1) * size:
+                    block = tokens[index * size:index * size + 8]
+                    raise ValueError(
+                        'Not a show interface block: ' +
+                        b' '.join(block).decode(errors='replace')
+                        )
+        return [
+            convert(tokens[field[1]::size])
+            for field, convert in zip(self.fields, self.converters)
+            ]
+
+    def run_records(self, tokens, second):
+        # Records of a run of whole blocks
+        names = self.names
+        for values in zip(*self.run_columns(tokens)):
+            record = {'second': second}
+            record.update(zip(names, values))
+            yield record
+
+    def parse(self, data, second=None):
+        """Records of the port blocks in data, a bytes-like object."""
+        for record in self.records([data], second):
+            yield record
+
+    def stream(self, path, chunk_size=parse_chunk):
+        """Records of a statistics file, mapped and read a chunk at a time.
+
+        Chunks end where a port's block begins, so every block is split
+        whole and only one chunk is held at a time.
+        """
+        for record in self.records(self.file_chunks(path, chunk_size), None):
+            yield record
+
+    def columns(self, path, chunk_size=parse_chunk):
+        """A statistics file a column at a time, as a dict of the fields.
+
+        Every field the layout shows maps to its values for each port
+        block in file order, and 'second' to the snapshot second of each.
+        With NumPy the counters come back as uint64 arrays (a list if one
+        passed 2**64) and the utilization as float64; otherwise, and for
+        the text fields, as lists. No per port dicts are built.
+        """
+        columns = dict((name, []) for name in ['second'] + self.names)
+        chunks = self.file_chunks(path, chunk_size)
+        for tokens, second in self.runs(chunks, None):
+            values = self.run_columns(tokens)
+            columns['second'].extend([second] * (len(tokens) // self.size))
+            for name, column in zip(self.names, values):
+                columns[name].extend(column)
+        if numpy is None:
+            return columns
+        for name, position, prefix, suffix, kind in self.fields:
+            try:
+                if kind is int:
+                    columns[name] = numpy.array(
+                        columns[name], dtype=numpy.uint64
+                        )
+                elif kind is float:
+                    columns[name] = numpy.array(
+                        columns[name], dtype=numpy.float64
+                        )
+            except OverflowError:
+                pass
+        return columns
+
+    def file_chunks(self, path, chunk_size):
+        # A file mapped and cut into chunks
+        with open(path, 'rb') as in_file:
+            if not os.fstat(in_file.fileno()).st_size:
+                return
+            view = mmap.mmap(in_file.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                for chunk in self.chunks(view, chunk_size):
+                    yield chunk
+            finally:
+                view.close()
+
+    def chunks(self, view, chunk_size):
+        size = len(view)
+        position = 0
+        while position < size:
+            end = min(position + chunk_size, size)
+            if end < size:
+                cut = view.rfind(self.marker, position + 1, end)
+                if cut == -1:
+                    cut = view.find(self.marker, end)
+                end = size if cut == -1 else cut
+            yield view[position:end]
+            position = end
+
+    def runs(self, chunks, second):
+        # The tokens of each run of blocks between snapshot lines, with
+        # the second they were written at
+        for chunk in chunks:
+            tokens = chunk.split()
+            index = 0
+            while index < len(tokens):
+                if tokens[index] == b'Snapshot':
+                    second = int(tokens[index + 1])
+                    index += 2
+                    continue
+                try:
+                    end = tokens.index(b'Snapshot', index)
+                except ValueError:
+                    end = len(tokens)
+                yield tokens[index:end], second
+                index = end
+
+    def records(self, chunks, second):
+        for tokens, second in self.runs(chunks, second):
+            for record in self.run_records(tokens, second):
+                yield record
+
+    def expected(self, interface, second=None):
+        """The record parsing a port's rendered block should give."""
+        row = dict(zip(row_fields, interface_row(interface)))
+        record = {'second': second}
+        for name in self.names:
+            value = row[name]
+            if self.kind(name) is float:
+                value = float('{0:.2f}'.format(value))
+            elif not isinstance(value, int):
+                value = str(value)
+            record[name] = value
+        return record
+
+
+def parse_interfaces(path):
+    """A text statistics file as columns, see InterfaceParser.columns."""
+    return InterfaceParser().columns(path)
+
+
+def parse_command(argv):
+    """generate_stats.py parse: statistics files to JSON lines."""
+    parser = argparse.ArgumentParser(
+        prog='generate_stats.py parse',
+        description='Read text statistics files back into one JSON ' +
+        'object per port on stdout'
+        )
+    parser.add_argument('paths', metavar='file', nargs='+')
+    parse_args = parser.parse_args(argv)
+    interface_parser = InterfaceParser()
+    out_file = sys.stdout
+    try:
+        for path in parse_args.paths:
+            for record in interface_parser.stream(path):
+                out_file.write(json.dumps(record) + '\n')
+    except ValueError as error:
+        parser.error(path + ': ' + str(error))
+    except BrokenPipeError:
+        pass
+
+
+def round_trip(argv):
+    """generate_stats.py roundtrip: check parse(render(stats)) == stats.
+
+    Generates a switch from the usual options into a temporary text file,
+    parses it back and compares every port's record with its stats.
+    Returns the number of ports that differ.
+    """
+    parser = build_parser()
+    interface_parser = InterfaceParser()
+    directory = tempfile.mkdtemp()
+    try:
+        path = os.path.join(directory, 'round_trip.txt')
+        args = parser.parse_args(
+            [path] + argv + ['--format', 'text', '--snapshot-format', 'full']
+            )
+        check_args(parser, args)
+        with redirect_stdout(io.StringIO()):
+            eth_table = generate_switch(args, args.seed)
+        parsed = list(interface_parser.stream(path))
+    finally:
+        shutil.rmtree(directory)
+    # The last records written hold the final state
+    parsed = parsed[len(parsed) - len(eth_table.interfaces):]
+    failed = 0
+    for interface, record in zip(eth_table.interfaces, parsed):
+        expected = interface_parser.expected(interface, record['second'])
+        if record != expected:
+            failed += 1
+            print('Port ' + interface.name + ' differs:')
+            for name in interface_parser.names:
+                if record.get(name) != expected[name]:
+                    print('  {0}: parsed {1!r}, expected {2!r}'.format(
+                        name, record.get(name), expected[name]
+                        ))
+    if len(parsed) != len(eth_table.interfaces):
+        failed += 1
+        print('Parsed {0} ports of {1}'.format(
+            len(parsed), len(eth_table.interfaces)
+            ))
+    print('{0} ports round tripped, {1} differ'.format(
+        len(eth_table.interfaces), failed
+        ))
+    return failed
+
+
 def welcome_banner():
     temp_version = ''
     for chr in range(0, len(script_version)):
@@ -1205,12 +4968,12 @@ def welcome_banner():
         "|  :  /`. /   |  | :,'              |  | :,'             \n"
         ";  |  |--`    :  : ' :              :  : ' :  .--.--.    \n"
         "|  :  ;_    .;__,'  /    ,--.--.  .;__,'  /  /  /    '   \n"
-        " \  \    `. |  |   |    /       \ |  |   |  |  :  /`./   \n"
-        "  `----.   \:__,'| :   .--.  .-. |:__,'| :  |  :  ;_     \n"
-        "  __ \  \  |  '  : |__  \__\/: . .  '  : |__ \  \    `.  \n"
-        " /  /`--'  /  |  | '.'| ,' .--.; |  |  | '.'| `----.   \ \n"
+        r" \  \    `. |  |   |    /       \ |  |   |  |  :  /`./   " "\n"
+        r"  `----.   \:__,'| :   .--.  .-. |:__,'| :  |  :  ;_     " "\n"
+        r"  __ \  \  |  '  : |__  \__\/: . .  '  : |__ \  \    `.  " "\n"
+        r" /  /`--'  /  |  | '.'| ,' .--.; |  |  | '.'| `----.   \ " "\n"
         "'--'.     /   ;  :    ;/  /  ,.  |  ;  :    ;/  /`--'  / \n"
-        "  `--'---'    |  ,   /;  :   .'   \ |  ,   /'--'.     /  \n"
+        r"  `--'---'    |  ,   /;  :   .'   \ |  ,   /'--'.     /  " "\n"
         "               ---`-' |  ,     .-./  ---`-'   `--'---'   \n"
         "                       `--`---'                          \n"
         "                                                         \n"
@@ -1220,14 +4983,16 @@ def welcome_banner():
         "=========================================================\n"
         )
 
-if __name__ == "__main__":
-    # try:
+
+def build_parser():
     parser = argparse.ArgumentParser(
         usage='%(prog)s [out-file] [options]',
         description='Generate Arbitrary Interface statistics for the purposes'
         ' of training/testing'
         )
-    parser.add_argument('out_file', type=str, help='File output')
+    parser.add_argument(
+        'out_file', type=str, help="File output ['-' for stdout]"
+        )
     parser.add_argument(
         '--total-ports', metavar='n', type=int, default=default_int_max,
         help='Total number of ports on the switch [-1=random,0...2048]'
@@ -1249,9 +5014,40 @@ if __name__ == "__main__":
         help='Start the loop after this many seconds from runtime end ' +
         '[0=off,1=single,2=two-port loop]'
         )
+    parser.add_argument(
+        '--loop-model', type=str, default='manual',
+        choices=['manual', 'storm'],
+        help="How looped ports behave [manual=flood returned once a " +
+        "second,storm=broadcast storm growing to line rate]"
+        )
+    parser.add_argument(
+        '--storm-gain', metavar='x', type=float, default=2.0,
+        help="Times a loop storm multiplies each second [1.0...]"
+        )
+    parser.add_argument(
+        '--bit-error-rate', metavar='x', type=float, default=0.0,
+        help="Bit error rate of every link, counted as CRC errors " +
+        "[0.0...1.0]"
+        )
+    parser.add_argument(
+        '--half-duplex', metavar='ports', type=str, default="",
+        help="Access ports running half duplex, which count collisions " +
+        "(ICX port list)"
+        )
+    parser.add_argument(
+        '--collision-rate', metavar='x', type=float,
+        default=default_collision_rate,
+        help="Chance a fully loaded half duplex port's frame collides " +
+        "[0.0...1.0]"
+        )
+    parser.add_argument(
+        '--discards', action='store_true',
+        help="Count input over the line rate as InDiscards"
+        )
     parser.add_argument(
         '--vlan', metavar='n', type=int, default=-1,
-        help='VLAN ID to use if using a single vlan [-1=random,1...4095]'
+        help='VLAN ID to use if using a single vlan ' +
+        '[-1=random,0=default,1...4095]'
         )
     parser.add_argument(
         '--vlan-list', metavar='vlan.txt', type=str, default="",
@@ -1263,8 +5059,9 @@ if __name__ == "__main__":
         help='Seed to use for MAC addresses'
         )
     parser.add_argument(
-        '--active', metavar='n', type=int, default=1,
-        help='Active ports [-1=random,1...total]'
+        '--active', metavar='n', type=int, default=0,
+        help="Active ports counting the uplinks, the rest Down or Disable " +
+        "[-1=random,0=all,1...total]"
         )
     parser.add_argument(
         '--root', metavar='n', type=int, default=default_uplink1,
@@ -1279,6 +5076,12 @@ if __name__ == "__main__":
         '--uplink2', metavar='n', type=int, default=default_uplink2,
         help='Uplink 2 [-1=random,1...total]'
         )
+    parser.add_argument(
+        '--uplink-mode', type=str, default='active-standby',
+        choices=['active-standby', 'lacp'],
+        help="How access ports feed the uplinks [active-standby=all to " +
+        "uplink1,lacp=alternate ports between uplink1 and uplink2]"
+        )
     parser.add_argument(
         '--uplink-speed', metavar='n', type=int, default=1000,
         help="Uplink speed [-1=random,100..." + str(max_interface_speed) + "]"
@@ -1295,11 +5098,16 @@ if __name__ == "__main__":
         )
     parser.add_argument(
         '--interface-speed', metavar='n', type=int, default=default_int_speed,
-        help='Standard Interface speed in Mbit/sec [-1=random,10...10000]'
+        help="Standard Interface speed in Mbit/sec [-1=random," + ",".join(
+            str(speed) for speed in DefaultInterfaceStats.speed_val_list
+            ) + "]"
         )
     parser.add_argument(
-        '--interface-mix', metavar='n', type=int, default=100,
-        help='Standard Interface speed in Mbit/sec [-1=random,0...100]'
+        '--interface-mix', metavar='n|speed=share,...', type=str,
+        default='100',
+        help="Percent of access ports at --interface-speed, the rest " +
+        "spread over the other speeds, or each speed's share " +
+        "[-1=random,0...100]"
         )
     parser.add_argument(
         '--unicast', metavar='n', type=int, default=10,
@@ -1318,6 +5126,21 @@ if __name__ == "__main__":
         type=int, default=default_multicast,
         help='Allows you to set a ceiling for random multicast [0...10000]'
         )
+    parser.add_argument(
+        '--multicast-groups', metavar='n', type=int, default=0,
+        help="IGMP snooped multicast groups, each port receiving only the " +
+        "groups it joined [0=flood multicast like broadcast]"
+        )
+    parser.add_argument(
+        '--multicast-joins', metavar='n', type=int, default=4,
+        help="Most groups of its VLAN each port joins [1...]"
+        )
+    parser.add_argument(
+        '--traffic-profile', metavar='kind[:key=value,...][@ports]',
+        type=str, action='append',
+        help="Unicast rate curve for some or all access ports, repeat for " +
+        "more groups [flat,diurnal,steps,bursts,poisson,pareto]"
+        )
     parser.add_argument(
         '--runtime', metavar='n', type=int, default=default_runtime,
         help='Runtime for the switch to base stats on [-1=random,1...31536000]'
@@ -1344,7 +5167,120 @@ if __name__ == "__main__":
         default=default_multicast_limit,
         help="Multicast limit if required [-1,0...100000]"
         )
+    parser.add_argument(
+        '--engine', type=str, default='python', choices=sorted(engines),
+        help="Generator engine [python=per port loop,numpy=array backed," +
+        "fast-forward=sample settled seconds]"
+        )
+    parser.add_argument(
+        '--shared-counters', action='store_true',
+        help="Keep every port's counters in one shared array instead of " +
+        "per port objects"
+        )
+    parser.add_argument(
+        '--buffer-size', metavar='n', type=int,
+        default=io.DEFAULT_BUFFER_SIZE,
+        help="Output buffer size in bytes [1=line buffered,2...]"
+        )
+    parser.add_argument(
+        '--seed', metavar='n', type=int, default=None,
+        help="Seed for every random choice, the same seed reproduces the " +
+        "same output with any stepping engine [default=fresh entropy]"
+        )
+    parser.add_argument(
+        '--format', type=str, default='text',
+        choices=['text'] + sorted(row_writers),
+        help="Output format [text=show interface,jsonl=JSON per port," +
+        "csv=row per port,binary=.npy records]"
+        )
+    parser.add_argument(
+        '--snapshot-every', metavar='n', type=int, default=0,
+        help="Write the counters every n simulated seconds instead of " +
+        "only at the end [0=off,1...runtime]"
+        )
+    parser.add_argument(
+        '--snapshot-format', type=str, default='full',
+        choices=['full', 'delta'],
+        help="Snapshot records [full=show interface view,delta=changed " +
+        "counters per port]"
+        )
+    parser.add_argument(
+        '--profile', action='store_true',
+        help="Report time per phase, setter calls and clamp hits"
+        )
+    parser.add_argument(
+        '--profile-stats', metavar='file.pstats', type=str, default="",
+        help="Also run under cProfile and save the pstats to this file"
+        )
+    parser.add_argument(
+        '--fleet', metavar='manifest.txt', type=str, default="",
+        help="Generate a fleet of switches, one command line per manifest " +
+        "line, into the out-file directory or .tar/.tar.gz archive"
+        )
+    parser.add_argument(
+        '--workers', metavar='n', type=int, default=0,
+        help="Fleet worker processes [0=one per core]"
+        )
+    return parser
+
+
+def check_args(parser, args):
+    if args.engine != 'python' and numpy is None:
+        parser.error('--engine ' + args.engine + ' requires numpy')
+    if args.buffer_size < 1:
+        parser.error('--buffer-size must be at least 1')
+    if args.snapshot_format == 'delta' and args.format != 'text':
+        parser.error('--snapshot-format delta needs --format text')
+    if args.vlan_list and not os.path.isfile(args.vlan_list):
+        parser.error('--vlan-list ' + args.vlan_list + ' not found')
+    if args.multicast_groups < 0 or args.multicast_joins < 1:
+        parser.error('--multicast-groups must be 0 or more and ' +
+                     '--multicast-joins at least 1')
+    for text in args.traffic_profile or []:
+        if numpy is None:
+            parser.error('--traffic-profile requires numpy')
+        try:
+            parse_traffic_profile(text)
+        except ValueError as error:
+            parser.error('--traffic-profile ' + str(error))
+    if args.storm_gain < 1:
+        parser.error('--storm-gain must be at least 1')
+    speeds = DefaultInterfaceStats.speed_val_list
+    if args.interface_speed != -1 and args.interface_speed not in speeds:
+        parser.error('--interface-speed must be -1 or one of ' +
+                     ','.join(str(speed) for speed in speeds))
+    try:
+        # Any percentage is valid, a random one is only drawn in setup
+        if not args.interface_mix.lstrip('-').isdigit():
+            parse_interface_mix(args.interface_mix, speeds[0])
+    except ValueError as error:
+        parser.error('--interface-mix ' + str(error))
+    if not (0 <= args.bit_error_rate <= 1 and 0 <= args.collision_rate <= 1):
+        parser.error('--bit-error-rate and --collision-rate must be ' +
+                     'between 0 and 1')
+    if (args.bit_error_rate > 0 or args.half_duplex) and numpy is None:
+        parser.error('--bit-error-rate and --half-duplex require numpy')
+    try:
+        parse_port_list(args.half_duplex)
+    except ValueError as error:
+        parser.error('--half-duplex ' + str(error))
+    if (args.profile or args.profile_stats) and args.fleet:
+        parser.error('--profile runs a single switch, not a --fleet')
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ['bench']:
+        bench(sys.argv[2:])
+        sys.exit(0)
+    if sys.argv[1:2] == ['parse']:
+        parse_command(sys.argv[2:])
+        sys.exit(0)
+    if sys.argv[1:2] == ['roundtrip']:
+        sys.exit(1 if round_trip(sys.argv[2:]) else 0)
+    # try:
+    parser = build_parser()
     args = parser.parse_args()
+    check_args(parser, args)
     reCP = CompiledPattern()
     main(args)
     # except Exception as e:
@@ -0,0 +1,24 @@
+import io
+import os
+import sys
+from contextlib import redirect_stdout
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import generate_stats
+
+
+@pytest.fixture
+def generate(tmp_path):
+    """Run one switch quietly, returning its table and output path."""
+    def generate(argv, name='out.txt'):
+        path = str(tmp_path / name)
+        parser = generate_stats.build_parser()
+        args = parser.parse_args([path] + argv)
+        generate_stats.check_args(parser, args)
+        with redirect_stdout(io.StringIO()):
+            eth_table = generate_stats.generate_switch(args, args.seed)
+        return eth_table, path
+    return generate
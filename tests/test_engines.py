@@ -0,0 +1,180 @@
+import io
+from contextlib import redirect_stdout
+
+import pytest
+
+import generate_stats
+
+pytest.importorskip('numpy')
+
+vlan_list = """vlan 10 name Users
+ untagged ethe 3 to 12
+!
+vlan 20 name Voice
+ untagged ethe 13 to 20
+"""
+
+# Option mixes the python and numpy engines must agree on byte for byte
+scenarios = {
+    'default': [],
+    'loops': ['--loop', '2', '--loop-after', '10'],
+    'uplink-loop': [
+        '--loop', '1', '--loop-interface1', '1', '--loop-after', '0',
+        '--packet-size', '-1', '--broadcast', '-1', '--multicast', '-1'
+        ],
+    'storm': [
+        '--loop', '1', '--loop-model', 'storm', '--broadcast-limit', '0'
+        ],
+    'rstp': ['--rstp-transitions', '3', '--root', '5'],
+    'impairments': [
+        '--bit-error-rate', '1e-6', '--half-duplex', '3 to 6', '--discards'
+        ],
+    'active': ['--active', '10', '--rstp-transitions', '2'],
+    'lacp': ['--uplink-mode', 'lacp', '--multicast-groups', '6'],
+    'speeds': ['--interface-mix', '1000=50,10000=50', '--packet-size', '-1'],
+    'profiles': ['--traffic-profile', 'bursts:on=5,off=10@3 to 9'],
+    'snapshots': ['--snapshot-every', '15', '--snapshot-format', 'delta'],
+    }
+
+
+def engine_output(generate, engine, argv):
+    eth_table, path = generate(argv + ['--engine', engine], engine + '.txt')
+    with open(path, 'rb') as out_file:
+        return out_file.read()
+
+
+@pytest.mark.parametrize('name', sorted(scenarios))
+def test_python_and_numpy_agree(generate, name):
+    argv = [
+        '--seed', '11', '--total-ports', '24', '--runtime', '60',
+        '--uplink1', '1', '--uplink2', '2'
+        ] + scenarios[name]
+    python = engine_output(generate, 'python', argv)
+    assert python == engine_output(generate, 'numpy', argv)
+
+
+def test_python_and_numpy_agree_vlan_list(generate, tmp_path):
+    path = tmp_path / 'vlan.txt'
+    path.write_text(vlan_list)
+    argv = [
+        '--seed', '12', '--total-ports', '24', '--runtime', '60',
+        '--uplink1', '1', '--uplink2', '2', '--vlan-list', str(path)
+        ]
+    python = engine_output(generate, 'python', argv)
+    assert python == engine_output(generate, 'numpy', argv)
+
+
+def test_seed_reproduces(generate):
+    argv = ['--seed', '13', '--total-ports', '24', '--runtime', '60']
+    first = engine_output(generate, 'numpy', argv)
+    assert first == engine_output(generate, 'numpy', argv)
+    assert first != engine_output(
+        generate, 'numpy', ['--seed', '14'] + argv[2:]
+        )
+
+
+# Option mixes fast-forward has to settle rather than step through
+fast_scenarios = {
+    'groups': ['--multicast-groups', '6'],
+    'uplink-loop': ['--loop', '1', '--loop-interface1', '1'],
+    'same-uplinks': ['--uplink2', '1'],
+    'cut-unicast': ['--interface-mix', '10=50,1000=50', '--discards'],
+    'cut-bursts': [
+        '--interface-mix', '10=50,1000=50',
+        '--traffic-profile', 'bursts:on=300,off=900'
+        ],
+    }
+
+
+def fast_forward_run(tmp_path, argv):
+    parser = generate_stats.build_parser()
+    args = parser.parse_args(
+        [str(tmp_path / 'ff.txt'), '--engine', 'fast-forward'] + argv
+        )
+    generate_stats.check_args(parser, args)
+    out = io.StringIO()
+    with redirect_stdout(out):
+        generate_stats.generate_switch(args, args.seed)
+    return out.getvalue()
+
+
+@pytest.mark.parametrize('name', sorted(fast_scenarios))
+def test_fast_forward_settles(tmp_path, name):
+    argv = [
+        '--seed', '15', '--total-ports', '24', '--runtime', '200000',
+        '--uplink1', '1', '--uplink2', '2'
+        ] + fast_scenarios[name]
+    assert 'Fast forward unavailable' not in fast_forward_run(tmp_path, argv)
+
+
+def test_fast_forward_settles_vlan_list(tmp_path):
+    path = tmp_path / 'vlan.txt'
+    path.write_text(vlan_list)
+    argv = [
+        '--seed', '16', '--total-ports', '24', '--runtime', '200000',
+        '--vlan-list', str(path)
+        ]
+    assert 'Fast forward unavailable' not in fast_forward_run(tmp_path, argv)
+
+
+def test_interface_mix_stays_on_fast_path(tmp_path, monkeypatch):
+    stepped = []
+    step_one = generate_stats.FastForwardEngine.step_one
+
+    def counted(engine, second):
+        stepped.append(second)
+        step_one(engine, second)
+
+    monkeypatch.setattr(generate_stats.FastForwardEngine, 'step_one', counted)
+    argv = [
+        '--seed', '1', '--runtime', '31536000', '--interface-mix', '90'
+        ]
+    assert 'Fast forward unavailable' not in fast_forward_run(tmp_path, argv)
+    assert len(stepped) < 100
+
+
+@pytest.mark.parametrize('engine', ['python', 'numpy', 'fast-forward'])
+def test_snapshots_match_counters(generate, engine):
+    parser = generate_stats.InterfaceParser()
+    argv = [
+        '--seed', '9', '--total-ports', '24', '--engine', engine,
+        '--runtime', '30'
+        ]
+    eth_table, path = generate(argv + ['--snapshot-every', '10'])
+    records = list(parser.stream(path))
+    seconds = (10, 20, 30)
+    for second in seconds:
+        # A run that stops at the snapshot ends on the same counters
+        eth_table, path = generate(argv[:-1] + [str(second)], 'final.txt')
+        shown = [record for record in records if record['second'] == second]
+        assert shown == [
+            parser.expected(interface, second)
+            for interface in eth_table.interfaces
+            ]
+
+    # Delta snapshots add up to the full ones
+    eth_table, path = generate(
+        argv + ['--snapshot-every', '10', '--snapshot-format', 'delta'],
+        'delta.txt'
+        )
+    with open(path) as in_file:
+        lines = [line.split() for line in in_file]
+    rates = generate_stats.counter_rows.in_bits_per_sec
+    totals = {}
+    for second in seconds:
+        for line in lines:
+            if int(line[0]) != second:
+                continue
+            for change in line[2:]:
+                name, value = change.split('=')
+                if value.startswith('+'):
+                    key = (line[1], name)
+                    totals[key] = totals.get(key, 0) + int(value)
+        for record in records:
+            if record['second'] != second:
+                continue
+            for name in generate_stats.counter_fields[:rates]:
+                if name in record:
+                    assert record[name] == totals.get(
+                        (record['port'], name), 0
+                        )
@@ -0,0 +1,59 @@
+import io
+import tarfile
+from contextlib import redirect_stdout
+
+import generate_stats
+
+manifest = """# name and switch options
+core.txt --total-ports 24 --runtime 20
+edge1.txt --total-ports 24 --runtime 20 --loop 1
+edge2.txt --total-ports 48 --runtime 10 --format jsonl
+
+access.txt --total-ports 24 --runtime 20 --seed 7
+"""
+names = ['core.txt', 'edge1.txt', 'edge2.txt', 'access.txt']
+
+
+def run_fleet(tmp_path, out_name, seed):
+    path = tmp_path / 'manifest.txt'
+    path.write_text(manifest)
+    out_file = str(tmp_path / out_name)
+    parser = generate_stats.build_parser()
+    args = parser.parse_args([
+        out_file, '--fleet', str(path), '--seed', str(seed),
+        '--workers', '2'
+        ])
+    generate_stats.check_args(parser, args)
+    with redirect_stdout(io.StringIO()):
+        generate_stats.fleet(args)
+    with tarfile.open(out_file) as tar:
+        assert tar.getnames() == names
+        return dict(
+            (name, tar.extractfile(name).read()) for name in names
+            )
+
+
+def test_fleet_archive_is_deterministic(tmp_path):
+    first = run_fleet(tmp_path, 'first.tar', 3)
+    assert first == run_fleet(tmp_path, 'second.tar.gz', 3)
+    other = run_fleet(tmp_path, 'other.tar', 4)
+    # The switch that sets its own seed ignores the fleet seed
+    assert other['access.txt'] == first['access.txt']
+    for name in names[:3]:
+        assert other[name] != first[name]
+
+
+def test_fleet_directory(tmp_path):
+    archived = run_fleet(tmp_path, 'fleet.tar', 3)
+    path = tmp_path / 'manifest.txt'
+    parser = generate_stats.build_parser()
+    args = parser.parse_args([
+        str(tmp_path / 'fleet'), '--fleet', str(path), '--seed', '3'
+        ])
+    with redirect_stdout(io.StringIO()):
+        generate_stats.fleet(args)
+    assert sorted(p.name for p in (tmp_path / 'fleet').iterdir()) == sorted(
+        names
+        )
+    for name in names:
+        assert (tmp_path / 'fleet' / name).read_bytes() == archived[name]
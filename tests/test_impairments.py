@@ -0,0 +1,92 @@
+from types import SimpleNamespace
+
+import pytest
+
+import generate_stats
+
+numpy = pytest.importorskip('numpy')
+
+
+def test_draws_never_exceed_frames():
+    impairments = generate_stats.Impairments(1e-3, 1.0, 64)
+    stats = [
+        SimpleNamespace(duplex=duplex, speed=speed)
+        for duplex in ('Full', 'Half') for speed in (10, 100, 1000)
+        ]
+    errors = generate_stats.PortImpairments(
+        impairments, stats, numpy.random.SeedSequence(5)
+        )
+    line = 1000 * generate_stats.multiplier // (64 * 8)
+    in_pkts = numpy.zeros(len(stats), dtype=object)
+    out_pkts = numpy.zeros(len(stats), dtype=object)
+    rng = numpy.random.default_rng(6)
+    for elapsed in range(10, 110, 10):
+        received = rng.integers(0, line * 10, len(stats))
+        sent = rng.integers(0, line * 10, len(stats))
+        in_pkts = in_pkts + received
+        out_pkts = out_pkts + sent
+        drawn = dict(errors.draw(elapsed, in_pkts, out_pkts))
+        assert numpy.all(drawn['crc_errors'] + drawn['in_bad_fragments'] <=
+                         received)
+        assert numpy.all(drawn['in_errors'] <= received)
+        assert numpy.all(drawn['collisions'] <= sent)
+        assert numpy.all(drawn['late_collisions'] <= drawn['collisions'])
+        assert not numpy.any(drawn['collisions'][:3])
+
+
+@pytest.mark.parametrize('engine', ['python', 'numpy', 'fast-forward'])
+def test_port_errors_never_exceed_frames(generate, engine):
+    eth_table, path = generate([
+        '--seed', '3', '--total-ports', '24', '--runtime', '300',
+        '--bit-error-rate', '1e-4', '--half-duplex', 'ethe 3 to 12',
+        '--collision-rate', '1', '--snapshot-every', '50',
+        '--engine', engine
+        ])
+    half = 0
+    for interface in eth_table.interfaces:
+        stats = interface.interface_stats
+        assert stats.in_errors == stats.crc_errors + stats.in_bad_fragments
+        assert stats.in_errors <= stats.in_pkts
+        assert stats.collisions <= stats.out_pkts
+        assert stats.late_collisions <= stats.collisions
+        if stats.duplex == 'Half':
+            half += 1
+            assert stats.in_bad_fragments > 0 and stats.collisions > 0
+    assert half == 10
+
+
+@pytest.mark.parametrize('engine', ['python', 'numpy', 'fast-forward'])
+def test_discards_are_the_input_cut_off(generate, monkeypatch, engine):
+    drawn = []
+    streams = generate_stats.ProfiledStreams
+    take, take_rows = streams.take, streams.take_rows
+
+    def record(draws):
+        drawn.append((numpy.array(draws[1]), numpy.array(draws[2])))
+        return draws
+
+    monkeypatch.setattr(streams, 'take', lambda self, *args: record(
+        take(self, *args)
+        ))
+    monkeypatch.setattr(streams, 'take_rows', lambda self, *args: record(
+        take_rows(self, *args)
+        ))
+    eth_table, path = generate([
+        '--seed', '4', '--total-ports', '24', '--runtime', '40',
+        '--interface-mix', '10=50,1000=50', '--multicast', '-1',
+        '--discards', '--loop', '0', '--uplink1', '1', '--uplink2', '2',
+        '--engine', engine
+        ])
+    multicast = numpy.concatenate([draws[0] for draws in drawn])
+    unicast = numpy.concatenate([draws[1] for draws in drawn])
+    assert len(unicast) == 40
+    stats = [
+        eth_table.interfaces[eth_table.interface_lookup[port]].interface_stats
+        for port in range(3, 25)
+        ]
+    ceiling = numpy.array([port_stats.pkt_ceiling for port_stats in stats])
+    cut_off = numpy.maximum(multicast + unicast - ceiling, 0).sum(axis=0)
+    assert cut_off.any()
+    assert [port_stats.in_discards for port_stats in stats] == (
+        cut_off.tolist()
+        )
@@ -0,0 +1,122 @@
+import pytest
+
+from generate_stats import InterfaceParser, parse_interfaces, round_trip
+
+
+def expected_records(parser, eth_table, second=None):
+    return [
+        parser.expected(interface, second)
+        for interface in eth_table.interfaces
+        ]
+
+
+@pytest.mark.parametrize('engine', ['python', 'numpy', 'fast-forward'])
+def test_round_trip_final(generate, engine):
+    pytest.importorskip('numpy')
+    parser = InterfaceParser()
+    eth_table, path = generate([
+        '--seed', '1', '--total-ports', '24', '--runtime', '30',
+        '--engine', engine
+        ])
+    assert list(parser.stream(path)) == expected_records(parser, eth_table)
+
+
+def test_round_trip_uplinks(generate):
+    parser = InterfaceParser()
+    eth_table, path = generate([
+        '--seed', '2', '--total-ports', '24', '--runtime', '30',
+        '--uplink1', '1', '--uplink2', '2', '--uplink-mode', 'lacp'
+        ])
+    records = list(parser.stream(path))
+    assert records == expected_records(parser, eth_table)
+    for port in (1, 2):
+        interface = eth_table.interfaces[eth_table.interface_lookup[port]]
+        record = records[eth_table.interface_lookup[port]]
+        assert record['port'] == interface.name
+        assert record['trunk'] == 'Yes'
+        assert record['in_pkts'] > 0
+
+
+def test_round_trip_snapshots(generate):
+    parser = InterfaceParser()
+    eth_table, path = generate([
+        '--seed', '3', '--total-ports', '48', '--runtime', '60',
+        '--snapshot-every', '20', '--snapshot-format', 'full'
+        ])
+    records = list(parser.stream(path))
+    ports = len(eth_table.interfaces)
+    assert len(records) == 3 * ports
+    seconds = [record['second'] for record in records]
+    assert seconds == [20] * ports + [40] * ports + [60] * ports
+    # The table holds the counters as they were last written
+    assert records[-ports:] == expected_records(parser, eth_table, 60)
+
+
+def test_round_trip_mixed(generate):
+    pytest.importorskip('numpy')
+    parser = InterfaceParser()
+    eth_table, path = generate([
+        '--seed', '4', '--total-ports', '48', '--runtime', '60',
+        '--active', '20', '--interface-mix', '1000=50,10000=50',
+        '--bit-error-rate', '1e-6', '--half-duplex', '5 to 8',
+        '--vlan', '0', '--engine', 'numpy'
+        ])
+    assert list(parser.stream(path)) == expected_records(parser, eth_table)
+
+
+def test_stream_chunks(generate):
+    parser = InterfaceParser()
+    eth_table, path = generate([
+        '--seed', '5', '--total-ports', '24', '--runtime', '20',
+        '--snapshot-every', '5'
+        ])
+    records = list(parser.stream(path))
+    assert list(parser.stream(path, chunk_size=1000)) == records
+    with open(path, 'rb') as in_file:
+        assert list(parser.parse(in_file.read())) == records
+
+
+def test_stream_empty(tmp_path):
+    path = tmp_path / 'empty.txt'
+    path.write_bytes(b'')
+    assert list(InterfaceParser().stream(str(path))) == []
+    columns = parse_interfaces(str(path))
+    assert all(len(column) == 0 for column in columns.values())
+
+
+def test_columns_match_records(generate):
+    numpy = pytest.importorskip('numpy')
+    parser = InterfaceParser()
+    eth_table, path = generate([
+        '--seed', '8', '--total-ports', '24', '--runtime', '20',
+        '--snapshot-every', '5', '--interface-mix', '1000=50,10000=50'
+        ])
+    records = list(parser.stream(path))
+    columns = parse_interfaces(path)
+    chunked = parser.columns(path, chunk_size=1000)
+    assert set(columns) == set(records[0])
+    assert columns['in_octets'].dtype == numpy.uint64
+    assert columns['in_utilization'].dtype == numpy.float64
+    for name, column in columns.items():
+        assert list(column) == [record[name] for record in records]
+        assert list(chunked[name]) == list(column)
+
+
+def test_parse_rejects_other_text(generate):
+    parser = InterfaceParser()
+    with pytest.raises(ValueError):
+        list(parser.parse(b'not a switch\n'))
+    eth_table, path = generate([
+        '--seed', '6', '--total-ports', '24', '--runtime', '5'
+        ])
+    with open(path, 'rb') as in_file:
+        data = in_file.read()
+    with pytest.raises(ValueError):
+        list(parser.parse(data[:len(data) // 2]))
+
+
+def test_round_trip_command(capsys):
+    assert round_trip([
+        '--seed', '7', '--total-ports', '24', '--runtime', '30'
+        ]) == 0
+    assert '0 differ' in capsys.readouterr().out
@@ -0,0 +1,53 @@
+import os
+import re
+import subprocess
+import sys
+
+import pytest
+
+script = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    'generate_stats.py'
+    )
+
+
+def profile_report(argv):
+    # --profile swaps the stats setters for the rest of the process, so
+    # each report comes from its own
+    result = subprocess.run(
+        [sys.executable, script, os.devnull, '--profile'] + argv,
+        stdout=subprocess.PIPE, universal_newlines=True, check=True
+        )
+    return result.stdout
+
+
+def clamp_hits(report):
+    return dict(
+        (name, int(hits)) for name, calls, hits in re.findall(
+            r'^  (limit_\w+) +(\d+) +(\d+)$', report, re.MULTILINE
+            )
+        )
+
+
+def test_profile_reports_phases():
+    report = profile_report([
+        '--seed', '1', '--total-ports', '24', '--runtime', '20'
+        ])
+    for phase in ('setup', 'generation', 'aggregation', 'output'):
+        assert phase in report
+    assert set(clamp_hits(report)) == {
+        'limit_pkt_per_sec', 'limit_bit_per_sec', 'limit_int_value'
+        }
+
+
+def test_clamp_hits_agree_across_engines():
+    pytest.importorskip('numpy')
+    argv = [
+        '--seed', '3', '--total-ports', '48', '--runtime', '60',
+        '--loop', '0'
+        ]
+    python = clamp_hits(profile_report(argv + ['--engine', 'python']))
+    numpy = clamp_hits(profile_report(argv + ['--engine', 'numpy']))
+    assert python['limit_bit_per_sec'] > 0
+    assert python['limit_pkt_per_sec'] == numpy['limit_pkt_per_sec']
+    assert python['limit_bit_per_sec'] == numpy['limit_bit_per_sec']
@@ -0,0 +1,51 @@
+import collections
+import random
+
+import pytest
+
+from generate_stats import parse_interface_mix, port_speeds
+
+
+def speed_counts(ports, mix):
+    speeds = port_speeds(ports, mix)
+    assert sorted(speeds) == sorted(ports)
+    return collections.Counter(speeds.values())
+
+
+def test_largest_remainder():
+    # 3.5, 2.1 and 1.4 ports: the spare port goes to the largest remainder
+    mix = [(100, 50.0), (1000, 30.0), (10000, 20.0)]
+    assert speed_counts(range(1, 8), mix) == {100: 4, 1000: 2, 10000: 1}
+    # 2.6, 2.6 and 4.8 ports
+    mix = [(10, 26.0), (100, 26.0), (1000, 48.0)]
+    assert speed_counts(range(1, 11), mix) == {10: 3, 100: 2, 1000: 5}
+
+
+@pytest.mark.parametrize('ports', [1, 7, 24, 48, 684])
+@pytest.mark.parametrize(
+    'text', ['90', '0', '33', '1000=50,10000=40,40000=10']
+    )
+def test_counts_round_the_shares(ports, text):
+    mix = parse_interface_mix(text, 100)
+    total = sum(share for speed, share in mix)
+    counts = speed_counts(range(1, ports + 1), mix)
+    assert sum(counts.values()) == ports
+    for speed, share in mix:
+        assert abs(counts[speed] - share * ports / total) < 1
+
+
+def test_single_speed_keeps_order():
+    state = random.getstate()
+    speeds = port_speeds([5, 3, 9], [(1000, 100.0), (100, 0.0)])
+    assert speeds == {5: 1000, 3: 1000, 9: 1000}
+    # Nothing to scatter, so the setup stream is left alone
+    assert random.getstate() == state
+
+
+def test_speeds_follow_the_seed():
+    mix = parse_interface_mix('1000=50,10000=50', 100)
+    random.seed(3)
+    first = port_speeds(range(1, 49), mix)
+    random.seed(3)
+    assert port_speeds(range(1, 49), mix) == first
+    assert len(set(first[port] for port in range(1, 25))) == 2
@@ -0,0 +1,48 @@
+import pytest
+
+import generate_stats
+from generate_stats import parse_traffic_profile
+
+
+@pytest.mark.parametrize('text', [
+    'nope',
+    'bursts:on=-1',
+    'bursts:on=0,off=0',
+    'diurnal:period=0',
+    'pareto:alpha=0',
+    'poisson:mean=-1',
+    'diurnal:speed=2',
+    'diurnal:low',
+    'bursts:on=x',
+    'steps:x=0.5',
+    'flat@bogus',
+    ])
+def test_rejects_bad_specs(text):
+    with pytest.raises(ValueError):
+        parse_traffic_profile(text)
+
+
+def test_check_args_rejects_bad_specs(capsys):
+    pytest.importorskip('numpy')
+    parser = generate_stats.build_parser()
+    args = parser.parse_args(['out.txt', '--traffic-profile', 'bursts:on=x'])
+    with pytest.raises(SystemExit):
+        generate_stats.check_args(parser, args)
+    assert '--traffic-profile bad traffic profile setting' in (
+        capsys.readouterr().err
+        )
+
+
+def test_parses_settings_and_ports():
+    profile = parse_traffic_profile('bursts:on=5, off=10@ethe 3 to 5')
+    assert profile.kind == 'bursts'
+    assert profile.params == {'on': 5.0, 'off': 10.0, 'high': 1.0,
+                              'low': 0.05}
+    assert profile.ports == [3, 4, 5]
+    assert parse_traffic_profile('flat:').ports is None
+
+
+def test_steps_are_sorted():
+    profile = parse_traffic_profile('steps:10=0.5,5=1')
+    assert profile.steps == [(5, 1.0), (10, 0.5)]
+    assert profile.params == {}
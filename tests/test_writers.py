@@ -0,0 +1,73 @@
+import csv
+import io
+import json
+
+import pytest
+
+import generate_stats
+from generate_stats import BinaryWriter, RowWriter, interface_row
+
+argv = ['--seed', '21', '--total-ports', '24', '--runtime', '30']
+
+
+def table_rows(eth_table):
+    return [interface_row(interface) for interface in eth_table.interfaces]
+
+
+def test_row_writer_is_abstract():
+    with pytest.raises(TypeError):
+        RowWriter(io.StringIO(), 0)
+
+
+def test_jsonl_rows(generate):
+    eth_table, path = generate(argv + ['--format', 'jsonl'], 'out.jsonl')
+    fields = ('second',) + generate_stats.row_fields
+    with open(path) as in_file:
+        records = [json.loads(line) for line in in_file]
+    assert records == [
+        json.loads(json.dumps(dict(zip(fields, (30,) + row))))
+        for row in table_rows(eth_table)
+        ]
+
+
+def test_csv_rows(generate):
+    eth_table, path = generate(argv + ['--format', 'csv'], 'out.csv')
+    with open(path, newline='') as in_file:
+        rows = list(csv.reader(in_file))
+    assert rows[0] == ['second'] + list(generate_stats.row_fields)
+    assert rows[1:] == [
+        ['30'] + ['' if value is None else str(value) for value in row]
+        for row in table_rows(eth_table)
+        ]
+
+
+def test_binary_loads_mapped(generate):
+    numpy = pytest.importorskip('numpy')
+    eth_table, path = generate(argv + ['--format', 'binary'], 'out.npy')
+    records = numpy.load(path, mmap_mode='r')
+    assert isinstance(records, numpy.memmap)
+    assert records.dtype.names == BinaryWriter.fields
+    rows = table_rows(eth_table)
+    assert len(records) == len(rows)
+    index = generate_stats.row_fields.index
+    for record, row in zip(records, rows):
+        assert record['second'] == 30
+        assert record['port'] == int(row[index('port')])
+        for name in generate_stats.counter_fields:
+            assert record[name] == row[index(name)]
+        assert record['in_utilization'] == row[index('in_utilization')]
+
+
+def test_binary_counters_wrap(generate):
+    numpy = pytest.importorskip('numpy')
+    eth_table, path = generate(argv + ['--runtime', '5'])
+    row = list(table_rows(eth_table)[0])
+    index = generate_stats.row_fields.index
+    row[index('in_octets')] = 2 ** 64 + 5
+    row[index('out_octets')] = 2 ** 65 - 1
+    out_file = io.BytesIO()
+    BinaryWriter(out_file, 1).write_rows(5, [tuple(row)])
+    out_file.seek(0)
+    record = numpy.load(out_file)[0]
+    assert record['in_octets'] == 5
+    assert record['out_octets'] == 2 ** 64 - 1